@@ -5,184 +5,368 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import threading
 import time
+from collections import deque
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# Optional compiled path for bulk replay/backfill evaluation
+try:
+    import numpy as np
+    from numba import njit, prange
+except ImportError:
+    np = None
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _check_breaches(values, idx, mins, maxs):
+        """Return per-reading breach codes (0 none, 1 min, 2 max) and the breached threshold"""
+        n = len(values)
+        codes = np.zeros(n, dtype=np.int8)
+        breached = np.full(n, np.nan)
+        for i in prange(n):
+            j = idx[i]
+            if j < 0:
+                continue
+            v = values[i]
+            # NaN limits (unset) never compare true, so they are skipped naturally
+            if v < mins[j]:
+                codes[i] = 1
+                breached[i] = mins[j]
+            elif v > maxs[j]:
+                codes[i] = 2
+                breached[i] = maxs[j]
+        return codes, breached
+
+class Alert:
+    """A single threshold alert; slots keep per-alert memory small and field access fast"""
+
+    __slots__ = ('id', 'equipment_id', 'sensor_type', 'topic', 'current_value', 'threshold_value',
+                 'threshold_type', 'severity', 'message', 'timestamp', 'resolved', 'resolved_at',
+                 'resolved_at_dt')
+
+    # Fields exposed through the API (resolved_at_dt is internal bookkeeping)
+    PUBLIC_FIELDS = __slots__[:-1]
+
+    def __init__(self, id: str, equipment_id: str, sensor_type: str, topic: str, current_value: float,
+                 threshold_value: float, threshold_type: str, severity: str, message: str, timestamp: str):
+        self.id = id
+        self.equipment_id = equipment_id
+        self.sensor_type = sensor_type
+        self.topic = topic
+        self.current_value = current_value
+        self.threshold_value = threshold_value
+        self.threshold_type = threshold_type
+        self.severity = severity
+        self.message = message
+        self.timestamp = timestamp
+        self.resolved = False
+        self.resolved_at = None
+        self.resolved_at_dt = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the plain dict shape returned by the API"""
+        return {k: getattr(self, k) for k in self.PUBLIC_FIELDS}
+
 class AlertService:
     """Service for evaluating sensor values against alert thresholds and managing alerts"""
 
     def __init__(self):
-        self.active_alerts = {}  # {alert_id: alert_data}
-        self.alert_history = []  # List of resolved alerts
-        self.lock = threading.RLock()
+        self.active_alerts = {}  # {(project_id, equipment_id, sensor_type, alert_type): Alert}
         self.max_history_size = 1000  # Keep last 1000 alerts in memory
+        self.alert_history = deque(maxlen=self.max_history_size)  # Resolved alerts, oldest evicted first
+        # Active alerts are touched on every reading; history only on resolve and admin queries
+        self._active_lock = threading.Lock()
+        self._history_lock = threading.Lock()
+        self._alerts_by_triple = {}  # {(equipment_id, sensor_type, topic): {alert_key}}
+        # Running stats over active alerts, maintained on create/update/resolve
+        self._severity_counts = {'warning': 0, 'critical': 0}
+        self._most_recent = None
+        # Alerts evicted from history, reused for new alerts during bursts
+        self._alert_pool = deque(maxlen=256)
+        self._snapshot = ({}, {})  # ({topic_name: threshold}, {sensor_type: threshold})
 
     def set_project_thresholds(self, project_id: str, thresholds: List[Dict[str, Any]]):
         """Update alert thresholds for a project"""
-        with self.lock:
-            self.thresholds = {t['topic_name']: t for t in thresholds}
+        # Work on copies so the derived fields never leak back into the stored project
+        thresholds = [self._prepare_threshold(t) for t in thresholds]
+        with self._active_lock:
+            by_topic = {t['topic_name']: t for t in thresholds}
+            # Like a scan of by_topic in order, the first threshold for a sensor type wins
+            by_sensor_suffix = {}
+            for order, threshold in enumerate(by_topic.values()):
+                threshold['_order'] = order
+                by_sensor_suffix.setdefault(threshold['sensor_type'], threshold)
+            # Publish both indexes with a single rebind so readers never see a mixed pair
+            self._snapshot = (by_topic, by_sensor_suffix)
             logger.info(f"Updated {len(thresholds)} alert thresholds for project {project_id}")
 
+    @staticmethod
+    def _prepare_threshold(threshold: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a threshold config and precompute the values used when an alert fires"""
+        prepared = dict(threshold)
+        prepared['_display_name'] = threshold['sensor_type'].replace('_', ' ').title()
+        # Critical once the value is more than 20% beyond the threshold
+        prepared['_max_crit'] = (threshold.get('max_value') or 0) * 1.2
+        prepared['_min_crit'] = (threshold.get('min_value') or 0) * 0.8
+        return prepared
+
+    @staticmethod
+    def _match_threshold(by_topic: Dict[str, Any], by_sensor_suffix: Dict[str, Any],
+                         topic: str) -> Optional[Dict[str, Any]]:
+        """First configured threshold whose topic equals, or whose sensor type ends, the given topic"""
+        threshold = by_topic.get(topic)
+        _, sep, suffix = topic.rpartition('/')
+        if sep:
+            by_suffix = by_sensor_suffix.get(suffix)
+            if by_suffix is not None and (threshold is None or by_suffix['_order'] < threshold['_order']):
+                threshold = by_suffix
+        return threshold
+
     def evaluate_sensor_reading(self, equipment_id: str, sensor_type: str, value: float,
                                topic: str, timestamp: str, project_id: str) -> Optional[Dict[str, Any]]:
         """
         Evaluate a sensor reading against alert thresholds
         Returns alert data if threshold is breached, None otherwise
         """
-        with self.lock:
-            if not hasattr(self, 'thresholds') or not self.thresholds:
-                return None
-
-            # Find matching threshold
-            threshold = None
-            for thresh_topic, thresh_data in self.thresholds.items():
-                # Match by exact topic or by sensor type in topic
-                if thresh_topic == topic or topic.endswith(f"/{thresh_data['sensor_type']}"):
-                    threshold = thresh_data
-                    break
+        # Lock-free read: the snapshot is only ever rebound, never mutated
+        by_topic, by_sensor_suffix = self._snapshot
+        if not by_topic:
+            return None
 
-            if not threshold or not threshold.get('enabled', True):
-                return None
+        # Match by exact topic or by the sensor type at the end of the topic
+        threshold = self._match_threshold(by_topic, by_sensor_suffix, topic)
+
+        if not threshold or not threshold.get('enabled', True):
+            return None
 
-            # Check if value breaches thresholds
-            alert_type = None
-            threshold_value = None
+        # Check if value breaches thresholds
+        alert_type = None
+        threshold_value = None
 
-            if threshold.get('min_value') is not None and value < threshold['min_value']:
-                alert_type = 'min'
-                threshold_value = threshold['min_value']
-            elif threshold.get('max_value') is not None and value > threshold['max_value']:
-                alert_type = 'max'
-                threshold_value = threshold['max_value']
+        if threshold.get('min_value') is not None and value < threshold['min_value']:
+            alert_type = 'min'
+            threshold_value = threshold['min_value']
+        elif threshold.get('max_value') is not None and value > threshold['max_value']:
+            alert_type = 'max'
+            threshold_value = threshold['max_value']
 
-            if alert_type is None:
-                # No threshold breached - check if we need to resolve existing alerts
-                self._resolve_alert_if_exists(equipment_id, sensor_type, topic)
-                return None
+        if alert_type is None:
+            # No threshold breached - check if we need to resolve existing alerts
+            self._resolve_alert_if_exists(equipment_id, sensor_type, topic)
+            return None
 
-            # Create alert ID
-            alert_id = f"{project_id}_{equipment_id}_{sensor_type}_{alert_type}"
+        # Tuple keys hash their (already hashed) parts instead of building a new string
+        alert_key = (project_id, equipment_id, sensor_type, alert_type)
 
+        with self._active_lock:
             # Check if alert already exists and is active
-            if alert_id in self.active_alerts:
+            existing = self.active_alerts.get(alert_key)
+            if existing is not None:
                 # Update existing alert timestamp
-                self.active_alerts[alert_id]['timestamp'] = timestamp
-                self.active_alerts[alert_id]['current_value'] = value
-                logger.debug(f"Updated existing alert {alert_id}")
+                existing.timestamp = timestamp
+                existing.current_value = value
+                self._track_most_recent(existing)
+                logger.debug(f"Updated existing alert {existing.id}")
                 return None  # Don't return duplicate alerts
 
-            # Create new alert
-            alert = {
-                'id': alert_id,
-                'equipment_id': equipment_id,
-                'sensor_type': sensor_type,
-                'topic': topic,
-                'current_value': value,
-                'threshold_value': threshold_value,
-                'threshold_type': alert_type,
-                'severity': self._determine_severity(value, threshold_value, alert_type, threshold),
-                'message': self._generate_alert_message(sensor_type, value, threshold_value, alert_type),
-                'timestamp': timestamp,
-                'resolved': False
-            }
+            # Create new alert, re-initialising a pooled instance in place when one is available
+            pool = self._alert_pool
+            alert = pool.pop() if pool else Alert.__new__(Alert)
+            alert.__init__(
+                f"{project_id}_{equipment_id}_{sensor_type}_{alert_type}",
+                equipment_id, sensor_type, topic, value, threshold_value, alert_type,
+                self._determine_severity(value, threshold_value, alert_type, threshold),
+                self._generate_alert_message(threshold, value, threshold_value, alert_type),
+                timestamp
+            )
 
             # Add to active alerts
-            self.active_alerts[alert_id] = alert
-            logger.warning(f"🚨 New alert triggered: {alert['message']}")
+            self.active_alerts[alert_key] = alert
+            self._severity_counts[alert.severity] = self._severity_counts.get(alert.severity, 0) + 1
+            self._track_most_recent(alert)
+            self._alerts_by_triple.setdefault((equipment_id, sensor_type, topic), set()).add(alert_key)
+            logger.warning(f"🚨 New alert triggered: {alert.message}")
 
-            return alert
+            return alert.to_dict()
+
+    def evaluate_batch(self, topics: List[str], values: List[float]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Check many readings against the current thresholds without touching active alerts.
+        Intended for replay/backfill; returns threshold_type/threshold_value/severity per
+        breaching reading and None otherwise. Uses a Numba kernel when available.
+        """
+        by_topic, by_sensor_suffix = self._snapshot
+
+        # Resolve each topic to a threshold slot once, in Python
+        slots = {}
+        matched = []
+        idx = []
+        for topic in topics:
+            threshold = self._match_threshold(by_topic, by_sensor_suffix, topic)
+            if not threshold or not threshold.get('enabled', True):
+                idx.append(-1)
+                continue
+            slot = slots.get(id(threshold))
+            if slot is None:
+                slot = slots[id(threshold)] = len(matched)
+                matched.append(threshold)
+            idx.append(slot)
+
+        if njit is not None:
+            nan = float('nan')
+            mins = np.array([nan if t.get('min_value') is None else t['min_value'] for t in matched], dtype=np.float64)
+            maxs = np.array([nan if t.get('max_value') is None else t['max_value'] for t in matched], dtype=np.float64)
+            codes, breached = _check_breaches(
+                np.asarray(values, dtype=np.float64), np.asarray(idx, dtype=np.int64), mins, maxs
+            )
+            codes = codes.tolist()
+            breached = breached.tolist()
+        else:
+            codes = []
+            breached = []
+            for value, slot in zip(values, idx):
+                threshold = matched[slot] if slot >= 0 else None
+                if threshold is None:
+                    codes.append(0)
+                    breached.append(None)
+                elif threshold.get('min_value') is not None and value < threshold['min_value']:
+                    codes.append(1)
+                    breached.append(threshold['min_value'])
+                elif threshold.get('max_value') is not None and value > threshold['max_value']:
+                    codes.append(2)
+                    breached.append(threshold['max_value'])
+                else:
+                    codes.append(0)
+                    breached.append(None)
+
+        results = []
+        for value, slot, code, threshold_value in zip(values, idx, codes, breached):
+            if code == 0:
+                results.append(None)
+                continue
+            alert_type = 'min' if code == 1 else 'max'
+            results.append({
+                'threshold_type': alert_type,
+                'threshold_value': threshold_value,
+                'severity': self._determine_severity(value, threshold_value, alert_type, matched[slot])
+            })
+        return results
 
     def _determine_severity(self, value: float, threshold: float, alert_type: str,
                           threshold_config: Dict[str, Any]) -> str:
         """Determine alert severity based on how far the value is from threshold"""
-        deviation = abs(value - threshold)
-
         # Simple severity logic - can be made more sophisticated
         if alert_type == 'max':
             # For max thresholds, higher values are more severe
-            if deviation > threshold * 0.2:  # More than 20% over threshold
+            if value > threshold_config['_max_crit']:  # More than 20% over threshold
                 return 'critical'
         else:  # min threshold
             # For min thresholds, lower values are more severe
-            if deviation > threshold * 0.2:  # More than 20% under threshold
+            if value < threshold_config['_min_crit']:  # More than 20% under threshold
                 return 'critical'
 
         return 'warning'
 
-    def _generate_alert_message(self, sensor_type: str, value: float,
+    def _generate_alert_message(self, threshold_config: Dict[str, Any], value: float,
                               threshold: float, alert_type: str) -> str:
         """Generate human-readable alert message"""
         direction = "above" if alert_type == "max" else "below"
-        return f"{sensor_type.replace('_', ' ').title()} is {direction} threshold: {value:.2f} (threshold: {threshold:.2f})"
+        return f"{threshold_config['_display_name']} is {direction} threshold: {value:.2f} (threshold: {threshold:.2f})"
 
     def _resolve_alert_if_exists(self, equipment_id: str, sensor_type: str, topic: str):
         """Resolve alerts that are no longer active"""
-        with self.lock:
-            # Find alerts for this equipment/sensor combination
-            alerts_to_resolve = []
-            for alert_id, alert in self.active_alerts.items():
-                if (alert['equipment_id'] == equipment_id and
-                    alert['sensor_type'] == sensor_type and
-                    alert['topic'] == topic):
-                    alerts_to_resolve.append(alert_id)
+        # Healthy steady state: nothing to resolve, so skip the lock entirely
+        if not self.active_alerts:
+            return
 
-            # Resolve found alerts
-            for alert_id in alerts_to_resolve:
-                alert = self.active_alerts[alert_id]
-                alert['resolved'] = True
-                alert['resolved_at'] = datetime.now().isoformat()
+        with self._active_lock:
+            # Find alerts for this equipment/sensor combination
+            alerts_to_resolve = self._alerts_by_triple.pop((equipment_id, sensor_type, topic), ())
+
+            # Resolve found alerts, sharing one timestamp across the batch
+            resolved = []
+            now = datetime.now()
+            now_iso = now.isoformat()
+            for alert_key in alerts_to_resolve:
+                alert = self.active_alerts.pop(alert_key)
+                alert.resolved = True
+                alert.resolved_at = now_iso
+                alert.resolved_at_dt = now
+                self._severity_counts[alert.severity] -= 1
+                resolved.append(alert)
+
+            # Only rescan when the most recent alert itself was resolved
+            if self._most_recent is not None and self._most_recent.resolved:
+                self._most_recent = max(self.active_alerts.values(), key=lambda x: x.timestamp, default=None)
+
+        if not resolved:
+            return
+
+        # Move to history, recycling whatever the bounded deque would evict
+        with self._history_lock:
+            overflow = len(self.alert_history) + len(resolved) - self.max_history_size
+            for _ in range(max(0, overflow)):
+                if not self.alert_history:
+                    break
+                self._recycle_alert(self.alert_history.popleft())
+            self.alert_history.extend(resolved)
 
-                # Move to history
-                self.alert_history.append(alert)
-                del self.active_alerts[alert_id]
+        for alert in resolved:
+            logger.info(f"✅ Alert resolved: {alert.message}")
 
-                # Keep history size manageable
-                if len(self.alert_history) > self.max_history_size:
-                    self.alert_history.pop(0)
+    def _recycle_alert(self, alert: Alert):
+        """Return an alert that is no longer referenced by the service to the pool"""
+        self._alert_pool.append(alert)
 
-                logger.info(f"✅ Alert resolved: {alert['message']}")
+    def _track_most_recent(self, alert: Alert):
+        """Update the most recent alert pointer; caller must hold the active lock"""
+        if self._most_recent is None or alert.timestamp >= self._most_recent.timestamp:
+            self._most_recent = alert
 
     def get_active_alerts(self, equipment_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all active alerts, optionally filtered by equipment"""
-        with self.lock:
+        with self._active_lock:
             alerts = list(self.active_alerts.values())
             if equipment_id:
-                alerts = [a for a in alerts if a['equipment_id'] == equipment_id]
-            return sorted(alerts, key=lambda x: x['timestamp'], reverse=True)
+                alerts = [a for a in alerts if a.equipment_id == equipment_id]
+            alerts.sort(key=lambda x: x.timestamp, reverse=True)
+            return [a.to_dict() for a in alerts]
 
     def get_alert_history(self, limit: int = 50, equipment_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get recent alert history"""
-        with self.lock:
-            history = self.alert_history[-limit:] if limit > 0 else self.alert_history
+        with self._history_lock:
+            start = max(0, len(self.alert_history) - limit) if limit > 0 else 0
+            history = list(islice(self.alert_history, start, None))
             if equipment_id:
-                history = [a for a in history if a['equipment_id'] == equipment_id]
-            return sorted(history, key=lambda x: x.get('resolved_at', x['timestamp']), reverse=True)
+                history = [a for a in history if a.equipment_id == equipment_id]
+            # History is appended in resolution order, so newest-first is just a reversal
+            history.reverse()
+            return [a.to_dict() for a in history]
 
     def clear_resolved_alerts(self, older_than_hours: int = 24):
         """Clear resolved alerts older than specified hours"""
-        with self.lock:
+        with self._history_lock:
             cutoff_time = datetime.now() - timedelta(hours=older_than_hours)
-            self.alert_history = [
-                alert for alert in self.alert_history
-                if datetime.fromisoformat(alert.get('resolved_at', alert['timestamp'])) > cutoff_time
-            ]
+            kept = deque(maxlen=self.max_history_size)
+            for alert in self.alert_history:
+                if alert.resolved_at_dt > cutoff_time:
+                    kept.append(alert)
+                else:
+                    self._recycle_alert(alert)
+            self.alert_history = kept
             logger.info(f"Cleared old alerts, {len(self.alert_history)} remaining in history")
 
     def get_alert_stats(self) -> Dict[str, Any]:
         """Get alert statistics"""
-        with self.lock:
-            active_count = len(self.active_alerts)
-            history_count = len(self.alert_history)
-
-            severity_counts = {'warning': 0, 'critical': 0}
-            for alert in self.active_alerts.values():
-                severity_counts[alert['severity']] = severity_counts.get(alert['severity'], 0) + 1
-
+        history_count = len(self.alert_history)
+        with self._active_lock:
             return {
-                'active_alerts': active_count,
+                'active_alerts': len(self.active_alerts),
                 'historical_alerts': history_count,
-                'severity_breakdown': severity_counts,
-                'most_recent_alert': max(self.active_alerts.values(), key=lambda x: x['timestamp']) if active_count > 0 else None
+                'severity_breakdown': dict(self._severity_counts),
+                'most_recent_alert': self._most_recent.to_dict() if self._most_recent is not None else None
             }
 
 # Global alert service instance
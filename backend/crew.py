@@ -6,10 +6,35 @@ import yaml
 import os
 import sys
 import logging
-from typing import Optional, List
+import threading
+import re
+import time
+import random
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Callable, Any
 from crewai import Agent, Task, Crew, Process, LLM
 from dotenv import load_dotenv
 
+# Token streaming needs a CrewAI that publishes LLM stream chunk events; without
+# it streaming callers only get task-level progress
+try:
+    from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+except ImportError:
+    try:
+        from crewai.utilities.events import crewai_event_bus
+        from crewai.utilities.events.llm_events import LLMStreamChunkEvent
+    except ImportError:
+        crewai_event_bus = None
+        LLMStreamChunkEvent = None
+
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -25,37 +50,140 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Query-specific placeholders prepended to each task description; CrewAI fills
+# them from the inputs passed to Crew.kickoff() on every query
+TASK_DESCRIPTION_PREFIXES = {
+    'data_extraction_task': "{full_context}\n\n",
+    'response_generation_task': 'Original User Query: "{user_query}"\n\n',
+}
+
+# Ask the LLM to stream its output so chunks can be forwarded while the crew runs.
+# Opt-in (CREWAI_STREAM_TOKENS=1): it changes how every query calls the provider
+STREAM_TOKENS = crewai_event_bus is not None and os.getenv("CREWAI_STREAM_TOKENS", "0") == "1"
+
+# Short-lived cache of final crew responses for repeated dashboard queries
+RESPONSE_CACHE_TTL = float(os.getenv("CREWAI_RESPONSE_CACHE_TTL", "10"))  # seconds, 0 disables
+RESPONSE_CACHE_SIZE = 512
+
+# Rate-limit retries: full-jitter exponential backoff unless the provider says how long to wait
+RATE_LIMIT_MAX_RETRIES = 3
+RATE_LIMIT_BASE_DELAY = 10  # seconds
+RATE_LIMIT_MAX_DELAY = 120  # seconds
+RETRY_AFTER_HEADERS = ('retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')
+# Lowercase substrings that mark a rate-limit error (Groq or Gemini)
+RATE_LIMIT_MARKERS = ('429', 'rate_limit', 'resource_exhausted', 'quota')
+_RATE_LIMIT_RE = re.compile('|'.join(map(re.escape, RATE_LIMIT_MARKERS)))
+_RETRY_IN_RE = re.compile(r'try again in ([\d.]+)s')
+
+def _retry_after_hint(error: Exception, error_str: str) -> Optional[float]:
+    """Seconds the provider asked us to wait, from response headers or the lowercased error text"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    for name in RETRY_AFTER_HEADERS:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            # Plain seconds ("20") or Groq/OpenAI style durations ("7.5s")
+            return float(str(value).rstrip('s'))
+        except ValueError:
+            pass
+
+    if "try again in" in error_str:
+        delay_match = _RETRY_IN_RE.search(error_str)
+        if delay_match:
+            return float(delay_match.group(1))
+    return None
+
+# Parsed YAML configs: {path: (mtime, config)} so unchanged files are not reparsed
+_CONFIG_CACHE = {}
+
+def _load_yaml_config(path: str) -> dict:
+    """Load a YAML config file, reusing the cached parse while the file is unchanged"""
+    # Nanosecond mtime so rapid successive edits are not mistaken for the cached version
+    mtime = os.stat(path).st_mtime_ns
+    cached = _CONFIG_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        config = yaml.load(f, Loader=SafeLoader)
+    _CONFIG_CACHE[path] = (mtime, config)
+    return config
+
 class ChatbotCrew:
     """CrewAI crew for processing chatbot queries"""
     
     def __init__(self):
-        """Initialize the crew with agents and tasks"""
+        """Load configurations; LLMs, agents, tasks and crew are built on the first query"""
         try:
-            # Initialize LLM using provider switching
-            self.llm = self._create_llm(temperature=0.5)
+            # LLM instances shared across agents, one per distinct temperature
+            self._llm_cache = {}
+            # Provider that last produced a working LLM, so the remaining
+            # temperatures skip a provider that already failed to initialize
+            self._llm_provider = None
             
             # Load configurations
             self._load_configs()
             
-            # Create agents
-            self.agents = self._create_agents()
+            self.llm = None
+            self.agents = None
+            self.tasks = None
+            self.crew = None
+            self._init_lock = threading.Lock()
+            # The shared crew re-interpolates its tasks on every kickoff, so kickoffs
+            # from concurrent worker threads must not overlap
+            self._kickoff_lock = threading.Lock()
             
-            # Create tasks
-            self.tasks = self._create_tasks()
+            # {key: (expires_at, response)}, oldest first
+            self._response_cache = OrderedDict()
+            self._response_cache_lock = threading.Lock()
             
-            # Create crew
-            self.crew = Crew(
-                agents=list(self.agents.values()),
-                tasks=self.tasks,
-                process=Process.sequential,  # Sequential execution: Agent 1 → Agent 2
-                verbose=True
-            )
+            # Monotonic time before which no query should hit the provider again; shared
+            # so queued queries wait out a rate limit instead of tripping it themselves
+            self._rate_limited_until = 0.0
+            
+            # Receiver for streamed LLM chunks of the kickoff in progress (set under _kickoff_lock)
+            self._token_callback = None
+            if STREAM_TOKENS:
+                crewai_event_bus.on(LLMStreamChunkEvent)(self._on_stream_chunk)
             
-            logger.info("ChatbotCrew initialized successfully")
+            logger.info("ChatbotCrew configured (components load on first query)")
         except Exception as e:
             logger.error(f"Failed to initialize ChatbotCrew: {e}")
             raise
     
+    def _ensure_initialized(self):
+        """Build the LLM, agents, tasks and crew once, on first use"""
+        if self.crew is not None:
+            return
+        
+        with self._init_lock:
+            if self.crew is not None:
+                return
+            try:
+                # Initialize LLM using provider switching
+                self.llm = self._get_llm(temperature=0.5)
+                
+                # Create agents
+                self.agents = self._create_agents()
+                
+                # Create tasks
+                self.tasks = self._create_tasks()
+                
+                # Create crew (assigned last so other threads only see a fully built crew)
+                self.crew = Crew(
+                    agents=list(self.agents.values()),
+                    tasks=self.tasks,
+                    process=Process.sequential,  # Sequential execution: Agent 1 → Agent 2
+                    verbose=True
+                )
+                
+                logger.info("ChatbotCrew initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize ChatbotCrew: {e}")
+                raise
+    
     def _load_configs(self):
         """Load agent and task configurations from YAML files"""
         config_dir = os.path.join(os.path.dirname(__file__), 'config')
@@ -68,11 +196,8 @@ class ChatbotCrew:
         if not os.path.exists(tasks_path):
             raise FileNotFoundError(f"Tasks config not found: {tasks_path}")
         
-        with open(agents_path, 'r') as f:
-            self.agents_config = yaml.safe_load(f)
-        
-        with open(tasks_path, 'r') as f:
-            self.tasks_config = yaml.safe_load(f)
+        self.agents_config = _load_yaml_config(agents_path)
+        self.tasks_config = _load_yaml_config(tasks_path)
 
     def _create_llm(self, temperature: float = 0.5) -> LLM:
         """
@@ -84,13 +209,15 @@ class ChatbotCrew:
         Returns:
             CrewAI LLM instance
         """
-        provider = os.getenv("LLM_PROVIDER", "tamus").lower()
+        provider = self._llm_provider or os.getenv("LLM_PROVIDER", "tamus").lower()
 
         if provider == "tamus":
             # Use TAMUS AI with custom LLM class
             try:
                 logger.info("Initializing TAMUS AI LLM...")
-                return TAMUSAILLM(temperature=temperature)
+                llm = TAMUSAILLM(temperature=temperature)
+                self._llm_provider = "tamus"
+                return llm
             except Exception as e:
                 logger.error(f"Failed to initialize TAMUS AI LLM: {e}")
                 logger.warning("Falling back to Gemini...")
@@ -113,53 +240,84 @@ class ChatbotCrew:
                 model_name = "gemini/gemini-2.5-flash"
 
             logger.info(f"Initializing Gemini LLM with model: {model_name}")
-            return LLM(
+            llm = LLM(
                 model=model_name,
                 api_key=api_key,
-                temperature=temperature
+                temperature=temperature,
+                stream=STREAM_TOKENS
             )
+            self._llm_provider = "gemini"
+            return llm
 
         raise ValueError(f"Unsupported LLM_PROVIDER: {provider}. Supported: tamus, gemini")
 
+    def _get_llm(self, temperature: float = 0.5) -> LLM:
+        """Return the shared LLM for a temperature, creating it on first use"""
+        # Round so near-identical YAML values (0.5 vs 0.50001) share one client
+        temperature = round(float(temperature), 2)
+        llm = self._llm_cache.get(temperature)
+        if llm is None:
+            llm = self._create_llm(temperature=temperature)
+            self._llm_cache[temperature] = llm
+        return llm
+
     def _create_agents(self) -> dict:
         """Create agents from configuration"""
-        agents = {}
+        if not self.agents_config:
+            return {}
         
-        for agent_key, config in self.agents_config.items():
-            try:
-                # Get LLM for this agent (with specific temperature if provided)
-                temperature = config.get('temperature', 0.5)
-                agent_llm = self._create_llm(temperature=temperature)
-                
-                # Prepare tools
-                tools = []
-                if 'tools' in config:
-                    for tool_name in config['tools']:
-                        if tool_name == 'execute_tdengine_query':
-                            tools.append(execute_tdengine_query)
-                        elif tool_name == 'get_tdengine_schema':
-                            tools.append(get_tdengine_schema)
-                        elif tool_name == 'search_domain_knowledge':
-                            tools.append(search_domain_knowledge)
-                
-                # Create agent
-                agent = Agent(
-                    role=config['role'],
-                    goal=config['goal'],
-                    backstory=config['backstory'],
-                    tools=tools,
-                    verbose=config.get('verbose', False),
-                    llm=agent_llm,
-                    allow_delegation=False
-                )
-                
-                agents[agent_key] = agent
-                logger.info(f"Created agent: {agent_key}")
-            except Exception as e:
-                logger.error(f"Error creating agent {agent_key}: {e}")
-                raise
-        
-        return agents
+        with ThreadPoolExecutor(max_workers=len(self.agents_config)) as executor:
+            # Warm the LLM cache first, one client per distinct temperature, so the
+            # agent builders below never race to construct the same client
+            temperatures = {
+                round(float(config.get('temperature', 0.5)), 2)
+                for config in self.agents_config.values()
+            } - set(self._llm_cache)
+            llm_futures = {t: executor.submit(self._create_llm, temperature=t) for t in temperatures}
+            for temperature, future in llm_futures.items():
+                self._llm_cache[temperature] = future.result()
+            
+            futures = {
+                agent_key: executor.submit(self._create_agent, agent_key, config)
+                for agent_key, config in self.agents_config.items()
+            }
+            # Collected in config order, which task lookup and the crew rely on
+            return {agent_key: future.result() for agent_key, future in futures.items()}
+    
+    def _create_agent(self, agent_key: str, config: dict) -> Agent:
+        """Create a single agent from its configuration"""
+        try:
+            # Get LLM for this agent (with specific temperature if provided)
+            temperature = config.get('temperature', 0.5)
+            agent_llm = self._get_llm(temperature=temperature)
+            
+            # Prepare tools
+            tools = []
+            if 'tools' in config:
+                for tool_name in config['tools']:
+                    if tool_name == 'execute_tdengine_query':
+                        tools.append(execute_tdengine_query)
+                    elif tool_name == 'get_tdengine_schema':
+                        tools.append(get_tdengine_schema)
+                    elif tool_name == 'search_domain_knowledge':
+                        tools.append(search_domain_knowledge)
+            
+            # Create agent
+            agent = Agent(
+                role=config['role'],
+                goal=config['goal'],
+                backstory=config['backstory'],
+                tools=tools,
+                verbose=config.get('verbose', False),
+                llm=agent_llm,
+                allow_delegation=False
+            )
+            
+            logger.info(f"Created agent: {agent_key}")
+            return agent
+        except Exception as e:
+            logger.error(f"Error creating agent {agent_key}: {e}")
+            raise
     
     def _create_tasks(self) -> list:
         """Create tasks from configuration"""
@@ -176,7 +334,7 @@ class ChatbotCrew:
                 
                 # Create task
                 task = Task(
-                    description=config['description'],
+                    description=TASK_DESCRIPTION_PREFIXES.get(task_key, '') + config['description'],
                     expected_output=config['expected_output'],
                     agent=agent
                 )
@@ -189,13 +347,53 @@ class ChatbotCrew:
         
         return tasks
     
+    @staticmethod
+    def _response_cache_key(user_query: str, page_type: str, cell_id: Optional[str],
+                            references: List[str], project_id: Optional[str]) -> str:
+        """Stable digest of everything that shapes a crew response"""
+        raw = f"{user_query}|{page_type}|{cell_id}|{sorted(references)}|{project_id}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        """Return a cached response if it has not expired"""
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._response_cache[key]
+                return None
+            return entry[1]
+
+    def _cache_response(self, key: str, response: str):
+        """Store a response, evicting the oldest entries beyond RESPONSE_CACHE_SIZE"""
+        with self._response_cache_lock:
+            self._response_cache[key] = (time.monotonic() + RESPONSE_CACHE_TTL, response)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    def clear_response_cache(self):
+        """Drop all cached responses, e.g. after the database schema changes"""
+        with self._response_cache_lock:
+            self._response_cache.clear()
+
+    def _on_stream_chunk(self, source: Any, event: Any):
+        """Event-bus handler: forward a streamed LLM chunk to the current query's receiver"""
+        callback = self._token_callback
+        if callback is not None and event.chunk:
+            callback(event.chunk)
+
     def process_query(
         self, 
         user_query: str,
         page_type: str = "monitor",
         cell_id: Optional[str] = None,
         references: Optional[List[str]] = None,
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        task_callback: Optional[Callable[[Any], None]] = None,
+        token_callback: Optional[Callable[[str], None]] = None,
+        nocache: bool = False
     ) -> str:
         """
         Process user query using CrewAI workflow
@@ -206,15 +404,25 @@ class ChatbotCrew:
             cell_id: Optional cell_id if on equipment page
             references: List of @references from frontend
             project_id: The current project ID for domain knowledge searches
+            task_callback: Optional callable invoked with each TaskOutput as tasks finish
+            token_callback: Optional callable invoked with each streamed LLM text chunk
+                (all agents' output, in arrival order; only when STREAM_TOKENS is on)
+            nocache: Skip the short-lived response cache and always run the crew
         
         Returns:
             Natural language response string
         """
         references = references or []
         
-        # Set project_id in global context for tools to access
-        import tools.vector_search_tool as vst
-        vst._current_project_id = project_id
+        use_cache = RESPONSE_CACHE_TTL > 0 and not nocache
+        if use_cache:
+            cache_key = self._response_cache_key(user_query, page_type, cell_id, references, project_id)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                logger.info("Returning cached CrewAI response")
+                return cached
+        
+        self._ensure_initialized()
         
         try:
             # Build context for the query
@@ -239,60 +447,60 @@ IMPORTANT:
 - Generate appropriate SQL queries based on the query intent
 """
             
-            # Create new tasks with updated descriptions for this specific query
-            # We need to recreate tasks with the query-specific context
-            data_extraction_task = Task(
-                description=f"{full_context}\n\n{self.tasks_config['data_extraction_task']['description']}",
-                expected_output=self.tasks_config['data_extraction_task']['expected_output'],
-                agent=self.agents['data_extraction_agent']
-            )
-            
-            response_generation_task = Task(
-                description=f"Original User Query: \"{user_query}\"\n\n{self.tasks_config['response_generation_task']['description']}",
-                expected_output=self.tasks_config['response_generation_task']['expected_output'],
-                agent=self.agents['response_generation_agent']
-            )
-            
-            # Create a temporary crew for this query
-            query_crew = Crew(
-                agents=list(self.agents.values()),
-                tasks=[data_extraction_task, response_generation_task],
-                process=Process.sequential,
-                verbose=True
-            )
+            # The pre-built crew interpolates these into its task descriptions on kickoff
+            query_inputs = {
+                'full_context': full_context,
+                'user_query': user_query
+            }
             
             # Execute crew with retry logic for rate limits
             logger.info(f"Processing query with CrewAI: {user_query[:100]}...")
             
-            import time
-            import re
-            max_retries = 3
-            retry_delay = 20  # Start with 20 seconds
+            max_retries = RATE_LIMIT_MAX_RETRIES
             
             for attempt in range(max_retries):
                 try:
-                    result = query_crew.kickoff()
+                    with self._kickoff_lock:
+                        # Another query hit the rate limit; wait until its backoff expires
+                        wait = self._rate_limited_until - time.monotonic()
+                        if wait > 0:
+                            logger.info(f"Waiting {wait:.1f}s for shared rate-limit backoff")
+                            time.sleep(wait)
+
+                        # Set project_id in global context for tools to access; done under
+                        # the kickoff lock so concurrent queries cannot swap it mid-run
+                        import tools.vector_search_tool as vst
+                        vst._current_project_id = project_id
+                        self.crew.task_callback = task_callback
+                        self._token_callback = token_callback
+                        try:
+                            result = self.crew.kickoff(inputs=query_inputs)
+                        finally:
+                            self._token_callback = None
                     # Extract final response (from Agent 2)
                     response = str(result)
                     logger.info(f"CrewAI response generated successfully")
+                    if use_cache:
+                        self._cache_response(cache_key, response)
                     return response
                 except Exception as e:
-                    error_str = str(e)
+                    error_str = str(e).lower()
                     # Check if it's a rate limit error (Groq or Gemini)
-                    if "429" in error_str or "rate_limit" in error_str.lower() or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
+                    if _RATE_LIMIT_RE.search(error_str):
                         if attempt < max_retries - 1:
-                            # Extract retry delay from error if available
-                            if "try again in" in error_str.lower():
-                                try:
-                                    delay_match = re.search(r'try again in ([\d.]+)s', error_str.lower())
-                                    if delay_match:
-                                        retry_delay = float(delay_match.group(1)) + 5  # Add 5 seconds buffer
-                                except:
-                                    pass
+                            hint = _retry_after_hint(e, error_str)
+                            if hint is not None:
+                                # Honour the provider's hint, plus a little jitter so
+                                # waiting queries do not all retry at the same instant
+                                retry_delay = hint + random.uniform(0, 1)
+                            else:
+                                cap = min(RATE_LIMIT_MAX_DELAY, RATE_LIMIT_BASE_DELAY * 2 ** attempt)
+                                retry_delay = random.uniform(0, cap)  # Full jitter
+                            self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + retry_delay)
                             
                             logger.warning(f"Rate limit exceeded (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay:.1f} seconds...")
-                            time.sleep(retry_delay)
-                            retry_delay *= 1.5  # Exponential backoff (less aggressive than before)
+                            # Runs on a worker thread (see CrewAIService), so the event loop is not blocked;
+                            # the next attempt waits out the shared backoff before kicking off
                             continue
                         else:
                             logger.error(f"Rate limit exceeded after {max_retries} attempts")
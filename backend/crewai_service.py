@@ -2,17 +2,49 @@
 CrewAI Service Wrapper
 Wrapper for integrating CrewAI with FastAPI endpoint
 """
+import asyncio
 import logging
-from typing import Optional, List
+import os
+from typing import Optional, List, AsyncIterator, Dict, Any
 from crew import get_chatbot_crew
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on queries handed to worker threads at once (tune to provider QPM)
+MAX_CONCURRENT_QUERIES = int(os.getenv("CREWAI_MAX_CONCURRENT_QUERIES", "4"))
+
+class TokenChunkSink:
+    """Regroups streamed LLM chunks so each emitted piece ends on a whitespace boundary"""
+
+    def __init__(self):
+        self._pending: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        """Buffer a chunk; return the text completed up to its last space/newline, or ''"""
+        # Only the new chunk is scanned, earlier text is never revisited
+        boundary = max(chunk.rfind(' '), chunk.rfind('\n')) + 1
+        if not boundary:
+            self._pending.append(chunk)
+            return ''
+        self._pending.append(chunk[:boundary])
+        ready = ''.join(self._pending)
+        self._pending = [chunk[boundary:]] if boundary < len(chunk) else []
+        return ready
+
+    def flush(self) -> str:
+        """Return whatever is still buffered"""
+        rest = ''.join(self._pending)
+        self._pending = []
+        return rest
+
 class CrewAIService:
     """Service wrapper for CrewAI crew"""
     
     def __init__(self):
         self.crew = None
+        self._query_semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+        # Identical queries already running: {query_key: Future}; later callers share the result
+        self._inflight = {}
         logger.info("CrewAI Service initialized")
     
     def _get_crew(self):
@@ -32,7 +64,8 @@ class CrewAIService:
         page_type: str = "monitor",
         cell_id: Optional[str] = None,
         references: Optional[List[str]] = None,
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        nocache: bool = False
     ) -> str:
         """
         Process user query using CrewAI
@@ -43,23 +76,125 @@ class CrewAIService:
             cell_id: Optional cell_id if on equipment page
             references: List of @references from frontend
             project_id: The current project ID for domain knowledge searches
+            nocache: Bypass the crew's short-lived response cache
         
         Returns:
             Natural language response string
         """
+        references = references or []
+        query_key = (user_query, page_type, cell_id, tuple(references), project_id, nocache)
+
+        # Coalesce concurrent duplicates (e.g. several dashboards asking the same thing)
+        # onto the single crew run that is already in flight
+        pending = self._inflight.get(query_key)
+        if pending is not None:
+            logger.info("Joining in-flight CrewAI run for identical query")
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[query_key] = future
         try:
             crew = self._get_crew()
-            response = crew.process_query(
-                user_query=user_query,
-                page_type=page_type,
-                cell_id=cell_id,
-                references=references or [],
-                project_id=project_id
-            )
+            # The crew workflow is blocking; run it in a worker thread so the event loop
+            # keeps serving WebSocket and HTTP traffic while the LLM calls are in flight
+            async with self._query_semaphore:
+                response = await asyncio.to_thread(
+                    crew.process_query,
+                    user_query=user_query,
+                    page_type=page_type,
+                    cell_id=cell_id,
+                    references=references,
+                    project_id=project_id,
+                    nocache=nocache
+                )
+            future.set_result(response)
             return response
+        except Exception as e:
+            logger.error(f"Error in CrewAI workflow: {e}")
+            future.set_exception(e)
+            # Mark retrieved so an unjoined failure does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Leader was cancelled; release anyone waiting on it
+                future.cancel()
+            del self._inflight[query_key]
+
+    async def process_query_stream(
+        self,
+        user_query: str,
+        page_type: str = "monitor",
+        cell_id: Optional[str] = None,
+        references: Optional[List[str]] = None,
+        project_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process user query using CrewAI, yielding progress events as the workflow runs
+        
+        Yields dicts of the form {'type': 'status', 'task': ...} as each agent task
+        finishes, then {'type': 'response', 'content': ...} with the final answer.
+        When the LLM streams (see crew.STREAM_TOKENS), {'type': 'token', 'content': ...}
+        events carry its text as it is generated, grouped into whole words; they are a
+        live preview of every agent's output and the 'response' event remains the
+        authoritative answer.
+        Errors are raised to the caller like process_query.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_task_complete(task_output):
+            # Called from the crew worker thread
+            name = getattr(task_output, 'name', None) or getattr(task_output, 'agent', '')
+            loop.call_soon_threadsafe(events.put_nowait, {'type': 'status', 'task': str(name)})
+
+        sink = TokenChunkSink()
+
+        def on_token(chunk: str):
+            # Called from the crew worker thread (or the event bus's handler thread)
+            text = sink.feed(chunk)
+            if text:
+                loop.call_soon_threadsafe(events.put_nowait, {'type': 'token', 'content': text})
+
+        crew = self._get_crew()
+
+        async def run_crew() -> str:
+            async with self._query_semaphore:
+                return await asyncio.to_thread(
+                    crew.process_query,
+                    user_query=user_query,
+                    page_type=page_type,
+                    cell_id=cell_id,
+                    references=references or [],
+                    project_id=project_id,
+                    task_callback=on_task_complete,
+                    token_callback=on_token
+                )
+
+        run = asyncio.create_task(run_crew())
+        try:
+            while not run.done():
+                getter = asyncio.create_task(events.get())
+                done, _ = await asyncio.wait({getter, run}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                else:
+                    getter.cancel()
+
+            # Drain status events that landed alongside completion
+            while not events.empty():
+                yield events.get_nowait()
+            tail = sink.flush()
+            if tail:
+                yield {'type': 'token', 'content': tail}
+
+            yield {'type': 'response', 'content': run.result()}
         except Exception as e:
             logger.error(f"Error in CrewAI workflow: {e}")
             raise
+        finally:
+            if not run.done():
+                run.cancel()
 
 # Global instance
 crewai_service = CrewAIService()
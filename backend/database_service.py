@@ -1,13 +1,51 @@
 import os
 import json
+import logging
+import sqlite3
 import time
+import atexit
+import mmap
+import itertools
+import uuid
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any
 from pathlib import Path
 import threading
 from dataclasses import dataclass, asdict
 from fastapi import HTTPException
 
+# orjson is several times faster than stdlib json; fall back when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    def _json_dumps(data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+else:
+    def _json_dumps(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    _json_loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+logger = logging.getLogger(__name__)
+
+def _json_text(data: Any) -> str:
+    """_json_dumps as text, falling back to json for values orjson rejects (e.g. ints beyond 64 bits)"""
+    try:
+        return _json_dumps(data).decode('utf-8')
+    except (TypeError, ValueError):
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+# Files at least this large are parsed straight from a memory map (orjson only)
+MMAP_READ_THRESHOLD = 1024 * 1024
+
 @dataclass
 class StoredMessage:
     id: str
@@ -38,10 +76,15 @@ class MessageSession:
         if self.sensor_types is None:
             self.sensor_types = []
 
+# Column order of the messages table, matching the StoredMessage fields
+MESSAGE_COLUMNS = ('id', 'timestamp', 'equipment_id', 'sensor_type', 'value', 'unit',
+                   'status', 'topic', 'raw_payload', 'project_id')
+
 class DatabaseService:
     """
-    Lightweight JSON file-based database for MQTT message storage.
-    Organizes data by projects for efficient access.
+    Lightweight file-based database for MQTT message storage.
+    Messages live in an append-only SQLite table (indexed per project);
+    sessions and projects are stored as JSON files organized by project.
     """
     
     def __init__(self, data_dir: str = "data"):
@@ -56,18 +99,167 @@ class DatabaseService:
         self.sessions_dir.mkdir(exist_ok=True)
         self.projects_dir.mkdir(exist_ok=True)
         
-        # Thread lock for file operations
-        self._lock = threading.Lock()
+        # Per-project locks for session/project files, so one project's writes never
+        # block another project's reads
+        self._project_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._project_locks_guard = threading.Lock()
+        
+        # Sessions are kept in memory once loaded and written back periodically
+        self._sessions: Dict[str, Dict[str, Dict[str, Any]]] = {}  # {project_id: {session_id: session}}
+        self._session_seen: Dict[tuple, tuple] = {}  # {(project_id, session_id): (equipment_ids, sensor_types) sets}
+        self._dirty_sessions = set()  # project_ids with unsaved session changes
+        self.session_persist_interval = 5.0  # seconds
+        self._last_session_persist = time.monotonic()
+        
+        # Parsed project files for read-only listings: {project_id: ((mtime_ns, size), project)}
+        self._project_cache: Dict[str, tuple] = {}
         
         # Message limits per project to prevent excessive storage
         self.max_messages_per_project = 5000
         
+        # Messages database (WAL so API reads don't block MQTT writes). A single writer
+        # connection guarded by _db_lock; readers use their own per-thread connections
+        self.messages_db_path = self.messages_dir / "messages.db"
+        self._db_lock = threading.Lock()
+        self._readers = threading.local()
+        self._migrated_projects = set()
+        self._conn = sqlite3.connect(str(self.messages_db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                equipment_id TEXT NOT NULL,
+                sensor_type TEXT NOT NULL,
+                value TEXT,
+                unit TEXT,
+                status TEXT,
+                topic TEXT,
+                raw_payload TEXT,
+                project_id TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_project ON messages (project_id, seq)")
+        # Lets get_messages_for_equipment read only that equipment's rows, newest first
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_equipment ON messages (project_id, equipment_id, seq)"
+        )
+        # Time-window reads (since/until) only touch the matching range of ISO timestamps
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_time ON messages (project_id, timestamp)")
+        self._conn.commit()
+        
+        # Message IDs: a per-process random prefix plus a counter, no syscalls per message
+        self._id_prefix = uuid.uuid4().hex[:8]
+        self._id_counter = itertools.count()
+        
+        # Incoming messages are buffered and written in batches by a background flusher
+        self.flush_interval = 0.1  # seconds
+        self.flush_batch_size = 500  # flush early once this many messages are waiting
+        # Bounded so a stalled disk drops the oldest buffered messages instead of exhausting memory
+        self.max_pending = 50000
+        self._pending: Deque[tuple] = deque(maxlen=self.max_pending)  # [(project_id, session_id, message_dict)]
+        self.dropped_messages = 0
+        self._reported_dropped = 0
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # held for a whole flush so readers wait for in-flight batches
+        self._flush_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="db-flusher", daemon=True)
+        self._flush_thread.start()
+        atexit.register(self._shutdown_flush)
+        
         print(f"📂 Database initialized at: {self.data_dir.absolute()}")
 
+    def _project_lock(self, project_id: str) -> threading.Lock:
+        """Get the lock guarding a project's session and project files"""
+        with self._project_locks_guard:
+            return self._project_locks[project_id]
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read-only connection; WAL lets these run alongside the writer"""
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.messages_db_path))
+            self._readers.conn = conn
+        return conn
+
+    def _ensure_migrated(self, project_id: str) -> None:
+        """Run the legacy JSON import for a project at most once per process"""
+        if project_id in self._migrated_projects:
+            return
+        with self._db_lock:
+            self._migrate_legacy_messages(project_id)
+        self._migrated_projects.add(project_id)
+
     def _get_project_messages_file(self, project_id: str) -> Path:
-        """Get the messages file path for a specific project"""
+        """Get the legacy JSON messages file path for a specific project"""
         return self.messages_dir / f"{project_id}_messages.json"
 
+    def _message_to_row(self, message: Dict[str, Any]) -> tuple:
+        """Convert a message dict to a messages table row (value/payload stored as JSON)"""
+        return (
+            message.get('id', ''), message.get('timestamp', ''), message.get('equipment_id', ''),
+            message.get('sensor_type', ''), _json_text(message.get('value')),
+            message.get('unit', ''),
+            message.get('status', 'active'), message.get('topic', ''),
+            _json_text(message.get('raw_payload')), message['project_id']
+        )
+
+    def _row_to_message(self, row: tuple) -> Dict[str, Any]:
+        """Convert a messages table row back to the stored message dict"""
+        message = dict(zip(MESSAGE_COLUMNS, row))
+        message['value'] = _json_loads(message['value'])
+        message['raw_payload'] = _json_loads(message['raw_payload'])
+        return message
+
+    def _insert_messages(self, project_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Insert messages and rotate the project down to max_messages_per_project; caller holds _db_lock
+
+        A message that cannot be converted or inserted is logged and skipped; the rest are kept.
+        """
+        rows = []
+        for message in messages:
+            try:
+                rows.append(self._message_to_row(message))
+            except Exception as e:
+                logger.error(f"Skipping message {message.get('id', '?')} for project {project_id}: {e}")
+        insert_sql = f"INSERT INTO messages ({', '.join(MESSAGE_COLUMNS)}) VALUES ({', '.join('?' * len(MESSAGE_COLUMNS))})"
+        # A savepoint scopes the undo to this batch; earlier uncommitted statements of the
+        # caller (e.g. import_project_data's DELETE) must survive a failed batch
+        self._conn.execute("SAVEPOINT insert_messages")
+        try:
+            self._conn.executemany(insert_sql, rows)
+        except sqlite3.Error as e:
+            # One bad row aborts executemany; retry row by row so only that row is lost
+            self._conn.execute("ROLLBACK TO insert_messages")
+            logger.error(f"Batch insert failed for project {project_id}, inserting row by row: {e}")
+            for row in rows:
+                try:
+                    self._conn.execute(insert_sql, row)
+                except sqlite3.Error as e:
+                    logger.error(f"Skipping message {row[0]} for project {project_id}: {e}")
+        self._conn.execute("RELEASE insert_messages")
+        # Rotate messages if exceeding limit
+        self._conn.execute(
+            """DELETE FROM messages WHERE project_id = ? AND seq <= (
+                   SELECT seq FROM messages WHERE project_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?
+               )""",
+            (project_id, project_id, self.max_messages_per_project)
+        )
+        self._conn.commit()
+
+    def _migrate_legacy_messages(self, project_id: str) -> None:
+        """Import a pre-SQLite {project_id}_messages.json file once; caller holds _db_lock"""
+        legacy_file = self._get_project_messages_file(project_id)
+        if not legacy_file.exists():
+            return
+        messages = self._read_json_file(legacy_file, [])
+        if messages:
+            self._insert_messages(project_id, messages)
+        legacy_file.rename(legacy_file.with_suffix('.json.migrated'))
+        print(f"📦 Migrated {len(messages)} legacy messages for project: {project_id}")
+
     def _get_project_sessions_file(self, project_id: str) -> Path:
         """Get the sessions file path for a specific project"""
         return self.sessions_dir / f"{project_id}_sessions.json"
@@ -76,10 +268,15 @@ class DatabaseService:
         """Safely read a JSON file"""
         try:
             if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(file_path, 'rb') as f:
+                    if orjson is not None and os.fstat(f.fileno()).st_size >= MMAP_READ_THRESHOLD:
+                        # Parse from the page cache instead of copying the file into a buffer
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            with memoryview(mm) as view:
+                                return orjson.loads(view)
+                    return _json_loads(f.read())
             return default if default is not None else []
-        except (json.JSONDecodeError, IOError) as e:
+        except (_JSONDecodeError, IOError) as e:
             print(f"❌ Error reading {file_path}: {e}")
             return default if default is not None else []
 
@@ -91,8 +288,9 @@ class DatabaseService:
             
             # Write to temporary file first, then rename (atomic operation)
             temp_file = file_path.with_suffix('.tmp')
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Compact output: these files are machine-read on hot paths (use export for readable dumps)
+            with open(temp_file, 'wb') as f:
+                f.write(_json_dumps(data))
             
             # Atomic rename
             temp_file.rename(file_path)
@@ -100,9 +298,83 @@ class DatabaseService:
             print(f"❌ Error writing {file_path}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to write data: {e}")
 
+    def _flush_loop(self) -> None:
+        """Background thread: flush buffered messages every flush_interval or when the batch fills"""
+        while True:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                if self.dropped_messages != self._reported_dropped:
+                    print(f"⚠️ Message buffer full, dropped {self.dropped_messages - self._reported_dropped} oldest messages "
+                          f"({self.dropped_messages} total)")
+                    self._reported_dropped = self.dropped_messages
+                self._flush_pending()
+                if self._dirty_sessions and time.monotonic() - self._last_session_persist >= self.session_persist_interval:
+                    self._persist_dirty_sessions()
+            except Exception as e:
+                logger.error(f"Error flushing buffered messages: {e}")
+
+    def _shutdown_flush(self) -> None:
+        """Write out buffered messages and unsaved session stats at interpreter exit"""
+        self._flush_pending()
+        self._persist_dirty_sessions()
+
+    def _load_sessions(self, project_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get a project's sessions from memory, reading the file on first touch; caller holds the project lock"""
+        sessions = self._sessions.get(project_id)
+        if sessions is None:
+            sessions_data = self._read_json_file(self._get_project_sessions_file(project_id), [])
+            sessions = {session['session_id']: session for session in sessions_data}
+            self._sessions[project_id] = sessions
+        return sessions
+
+    def _persist_sessions(self, project_id: str) -> None:
+        """Write a project's in-memory sessions to disk; caller holds the project lock"""
+        self._write_json_file(self._get_project_sessions_file(project_id), list(self._load_sessions(project_id).values()))
+        self._dirty_sessions.discard(project_id)
+
+    def _persist_dirty_sessions(self) -> None:
+        """Write every project whose session stats changed since the last save"""
+        for project_id in list(self._dirty_sessions):
+            with self._project_lock(project_id):
+                if project_id in self._dirty_sessions:
+                    self._persist_sessions(project_id)
+        self._last_session_persist = time.monotonic()
+
+    def _flush_pending(self) -> None:
+        """Write all buffered messages with one insert and one session update per project"""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                pending, self._pending = self._pending, deque(maxlen=self.max_pending)
+            
+            by_project = defaultdict(list)
+            by_session = defaultdict(list)
+            for project_id, session_id, message in pending:
+                by_project[project_id].append(message)
+                by_session[(project_id, session_id)].append(message)
+            
+            # Failures are per project so one project cannot lose the others' messages
+            for project_id, messages in by_project.items():
+                try:
+                    self._ensure_migrated(project_id)
+                    with self._db_lock:
+                        self._insert_messages(project_id, messages)
+                except Exception as e:
+                    logger.error(f"Error writing {len(messages)} buffered messages for project {project_id}: {e}")
+            
+            # Update session statistics
+            for (project_id, session_id), messages in by_session.items():
+                try:
+                    with self._project_lock(project_id):
+                        self._update_session_stats(project_id, session_id, messages)
+                except Exception as e:
+                    logger.error(f"Error updating stats for session {session_id}: {e}")
+
     def start_session(self, project_id: str, project_name: str) -> str:
         """Start a new message recording session"""
-        with self._lock:
+        with self._project_lock(project_id):
             session_id = f"session_{int(time.time() * 1000)}_{os.urandom(4).hex()}"
             
             session = MessageSession(
@@ -112,118 +384,151 @@ class DatabaseService:
                 start_time=datetime.now().isoformat()
             )
             
-            # Read existing sessions for this project
-            sessions_file = self._get_project_sessions_file(project_id)
-            sessions_data = self._read_json_file(sessions_file, [])
-            
             # Add new session
-            sessions_data.append(asdict(session))
-            self._write_json_file(sessions_file, sessions_data)
+            self._load_sessions(project_id)[session_id] = asdict(session)
+            self._persist_sessions(project_id)
             
             print(f"📹 Started recording session: {session_id} for project: {project_name}")
             return session_id
 
     def stop_session(self, project_id: str, session_id: str) -> None:
         """Stop a recording session"""
-        with self._lock:
-            sessions_file = self._get_project_sessions_file(project_id)
-            sessions_data = self._read_json_file(sessions_file, [])
-            
+        # Make sure the session's buffered messages are counted before it closes
+        self._flush_pending()
+        with self._project_lock(project_id):
             # Find and update the session
-            for session in sessions_data:
-                if session['session_id'] == session_id:
-                    session['end_time'] = datetime.now().isoformat()
-                    break
+            session = self._load_sessions(project_id).get(session_id)
+            if session is not None:
+                session['end_time'] = datetime.now().isoformat()
+            self._session_seen.pop((project_id, session_id), None)
             
-            self._write_json_file(sessions_file, sessions_data)
+            self._persist_sessions(project_id)
             print(f"⏹️ Stopped recording session: {session_id}")
 
+    def _message_record(self, project_id: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Stored form of an MQTT message (plain dict with the StoredMessage fields; asdict() would deep-copy the payload)"""
+        return {
+            'id': f"msg_{self._id_prefix}_{next(self._id_counter)}",
+            'timestamp': message_data['timestamp'] if 'timestamp' in message_data else datetime.now().isoformat(),
+            'equipment_id': message_data['equipment_id'],
+            'sensor_type': message_data['sensor_type'],
+            'value': message_data['value'],
+            'unit': message_data.get('unit', ''),
+            'status': message_data.get('status', 'active'),
+            'topic': message_data.get('topic', ''),
+            'raw_payload': message_data.get('raw_payload', message_data),
+            'project_id': project_id
+        }
+
     def store_message(self, project_id: str, session_id: str, message_data: Dict[str, Any]) -> None:
-        """Store a new MQTT message"""
-        with self._lock:
-            # Create message record
-            message = StoredMessage(
-                id=f"msg_{int(time.time() * 1000)}_{os.urandom(4).hex()}",
-                timestamp=message_data.get('timestamp', datetime.now().isoformat()),
-                equipment_id=message_data['equipment_id'],
-                sensor_type=message_data['sensor_type'],
-                value=message_data['value'],
-                unit=message_data.get('unit', ''),
-                status=message_data.get('status', 'active'),
-                topic=message_data.get('topic', ''),
-                raw_payload=message_data.get('raw_payload', message_data),
-                project_id=project_id
-            )
-            
-            # Read existing messages for this project
-            messages_file = self._get_project_messages_file(project_id)
-            messages_data = self._read_json_file(messages_file, [])
-            
-            # Add new message
-            messages_data.append(asdict(message))
-            
-            # Rotate messages if exceeding limit
-            if len(messages_data) > self.max_messages_per_project:
-                messages_data = messages_data[-self.max_messages_per_project:]
-            
-            self._write_json_file(messages_file, messages_data)
-            
-            # Update session statistics
-            self._update_session_stats(project_id, session_id, message)
+        """Store a new MQTT message (buffered; written by the background flusher)"""
+        self.store_messages(project_id, session_id, [message_data])
 
-    def _update_session_stats(self, project_id: str, session_id: str, message: StoredMessage) -> None:
-        """Update session statistics"""
-        sessions_file = self._get_project_sessions_file(project_id)
-        sessions_data = self._read_json_file(sessions_file, [])
-        
-        for session in sessions_data:
-            if session['session_id'] == session_id:
-                session['total_messages'] += 1
-                
-                # Update equipment IDs
-                if message.equipment_id not in session['equipment_ids']:
-                    session['equipment_ids'].append(message.equipment_id)
-                
-                # Update sensor types
-                if message.sensor_type not in session['sensor_types']:
-                    session['sensor_types'].append(message.sensor_type)
-                
-                break
+    def store_messages(self, project_id: str, session_id: str, messages_data: List[Dict[str, Any]]) -> None:
+        """Store several MQTT messages of one session with a single buffer lock acquisition"""
+        records = [(project_id, session_id, self._message_record(project_id, message_data))
+                   for message_data in messages_data]
         
-        self._write_json_file(sessions_file, sessions_data)
+        with self._pending_lock:
+            overflow = len(self._pending) + len(records) - self.max_pending
+            if overflow > 0:
+                self.dropped_messages += overflow  # extend below evicts the oldest
+            self._pending.extend(records)
+            if len(self._pending) >= self.flush_batch_size:
+                self._flush_event.set()
 
-    def get_messages_for_project(self, project_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get all messages for a specific project"""
-        messages_file = self._get_project_messages_file(project_id)
-        messages_data = self._read_json_file(messages_file, [])
-        
-        if limit:
-            messages_data = messages_data[-limit:]
+    def _update_session_stats(self, project_id: str, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Update in-memory session statistics for a batch of messages; persisted by the flusher"""
+        session = self._load_sessions(project_id).get(session_id)
+        if session is None:
+            return
         
-        return messages_data
-
-    def get_messages_for_equipment(self, project_id: str, equipment_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get messages for a specific equipment in a project"""
-        messages_data = self.get_messages_for_project(project_id)
+        # Sets mirror the stored lists for O(1) dedup
+        seen = self._session_seen.get((project_id, session_id))
+        if seen is None:
+            seen = (set(session['equipment_ids']), set(session['sensor_types']))
+            self._session_seen[(project_id, session_id)] = seen
+        seen_equipment, seen_sensors = seen
         
-        # Filter by equipment ID
-        equipment_messages = [msg for msg in messages_data if msg['equipment_id'] == equipment_id]
+        session['total_messages'] += len(messages)
+        for message in messages:
+            # Update equipment IDs
+            if message['equipment_id'] not in seen_equipment:
+                seen_equipment.add(message['equipment_id'])
+                session['equipment_ids'].append(message['equipment_id'])
+            
+            # Update sensor types
+            if message['sensor_type'] not in seen_sensors:
+                seen_sensors.add(message['sensor_type'])
+                session['sensor_types'].append(message['sensor_type'])
         
+        self._dirty_sessions.add(project_id)
+
+    def get_messages_for_project(self, project_id: str, limit: Optional[int] = None,
+                                 since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get all messages for a specific project (oldest first), optionally within [since, until]"""
+        return self._query_messages("project_id = ?", (project_id,), project_id, limit, since, until)
+
+    def get_messages_for_equipment(self, project_id: str, equipment_id: str, limit: Optional[int] = None,
+                                   since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get messages for a specific equipment in a project (oldest first), optionally within [since, until]"""
+        return self._query_messages("project_id = ? AND equipment_id = ?", (project_id, equipment_id),
+                                    project_id, limit, since, until)
+
+    def _query_messages(self, where: str, params: tuple, project_id: str, limit: Optional[int],
+                        since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch the newest `limit` matching messages, returned in insertion order"""
+        # ISO-8601 timestamps sort lexicographically, so range filters work on the text column
+        if since:
+            where += " AND timestamp >= ?"
+            params = params + (since,)
+        if until:
+            where += " AND timestamp <= ?"
+            params = params + (until,)
+        sql = f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE {where} ORDER BY seq DESC"
         if limit:
-            equipment_messages = equipment_messages[-limit:]
-        
-        return equipment_messages
+            sql += " LIMIT ?"
+            params = params + (limit,)
+        # Read-your-writes: include messages still waiting in the buffer
+        self._flush_pending()
+        self._ensure_migrated(project_id)
+        rows = self._reader().execute(sql, params).fetchall()
+        rows.reverse()
+        return [self._row_to_message(row) for row in rows]
+
+    def _count_messages(self, project_id: str) -> tuple:
+        """Return (message_count, approximate_bytes) for a project"""
+        self._flush_pending()
+        self._ensure_migrated(project_id)
+        count, size = self._reader().execute(
+            """SELECT COUNT(*), COALESCE(SUM(LENGTH(id) + LENGTH(timestamp) + LENGTH(equipment_id)
+               + LENGTH(sensor_type) + LENGTH(value) + LENGTH(unit) + LENGTH(status)
+               + LENGTH(topic) + LENGTH(raw_payload)), 0)
+               FROM messages WHERE project_id = ?""",
+            (project_id,)
+        ).fetchone()
+        return count, size
 
     def get_sessions_for_project(self, project_id: str) -> List[Dict[str, Any]]:
         """Get all sessions for a specific project"""
-        sessions_file = self._get_project_sessions_file(project_id)
-        return self._read_json_file(sessions_file, [])
+        self._flush_pending()
+        with self._project_lock(project_id):
+            # Copy so callers never see (or cause) concurrent updates to the live records
+            return [
+                {**session, 'equipment_ids': list(session['equipment_ids']),
+                 'sensor_types': list(session['sensor_types'])}
+                for session in self._load_sessions(project_id).values()
+            ]
 
     def get_all_projects(self) -> List[str]:
         """Get list of all projects that have data"""
         projects = set()
         
-        # Check messages directory
+        # Check messages database
+        self._flush_pending()
+        projects.update(row[0] for row in self._reader().execute("SELECT DISTINCT project_id FROM messages"))
+        
+        # Check legacy (not yet migrated) message files
         for file_path in self.messages_dir.glob("*_messages.json"):
             project_id = file_path.stem.replace('_messages', '')
             projects.add(project_id)
@@ -237,41 +542,56 @@ class DatabaseService:
 
     def export_project_data(self, project_id: str) -> Dict[str, Any]:
         """Export all data for a project"""
+        messages = self.get_messages_for_project(project_id)
         return {
             'project_id': project_id,
-            'messages': self.get_messages_for_project(project_id),
+            'messages': messages,
             'sessions': self.get_sessions_for_project(project_id),
             'exported_at': datetime.now().isoformat(),
-            'total_messages': len(self.get_messages_for_project(project_id))
+            'total_messages': len(messages)
         }
 
     def import_project_data(self, data: Dict[str, Any]) -> str:
         """Import project data"""
-        with self._lock:
-            project_id = data['project_id']
-            
-            # Import messages
+        self._flush_pending()
+        project_id = data['project_id']
+        with self._project_lock(project_id):
+            # Import messages (replacing any existing ones)
             if 'messages' in data:
-                messages_file = self._get_project_messages_file(project_id)
-                self._write_json_file(messages_file, data['messages'])
+                with self._db_lock:
+                    self._conn.execute("DELETE FROM messages WHERE project_id = ?", (project_id,))
+                    legacy_file = self._get_project_messages_file(project_id)
+                    if legacy_file.exists():
+                        legacy_file.unlink()
+                    self._insert_messages(project_id, [
+                        {**message, 'project_id': project_id} for message in data['messages']
+                    ])
             
             # Import sessions
             if 'sessions' in data:
-                sessions_file = self._get_project_sessions_file(project_id)
-                self._write_json_file(sessions_file, data['sessions'])
+                self._sessions[project_id] = {session['session_id']: session for session in data['sessions']}
+                self._session_seen = {k: v for k, v in self._session_seen.items() if k[0] != project_id}
+                self._persist_sessions(project_id)
             
             print(f"📥 Imported data for project: {project_id}")
             return project_id
 
     def delete_project_data(self, project_id: str) -> None:
         """Delete all data for a project"""
-        with self._lock:
+        self._flush_pending()
+        with self._project_lock(project_id):
             messages_file = self._get_project_messages_file(project_id)
             sessions_file = self._get_project_sessions_file(project_id)
             
-            # Remove files if they exist
-            if messages_file.exists():
-                messages_file.unlink()
+            # Remove messages and files if they exist
+            with self._db_lock:
+                self._conn.execute("DELETE FROM messages WHERE project_id = ?", (project_id,))
+                self._conn.commit()
+                if messages_file.exists():
+                    messages_file.unlink()
+            self._sessions.pop(project_id, None)
+            self._dirty_sessions.discard(project_id)
+            self._session_seen = {k: v for k, v in self._session_seen.items() if k[0] != project_id}
             if sessions_file.exists():
                 sessions_file.unlink()
             
@@ -279,31 +599,32 @@ class DatabaseService:
 
     def get_storage_stats(self) -> Dict[str, Any]:
         """Get storage statistics"""
+        project_ids = self.get_all_projects()
         stats = {
-            'total_projects': len(self.get_all_projects()),
+            'total_projects': len(project_ids),
             'total_storage_mb': 0,
             'projects': {}
         }
         
         total_size = 0
-        for project_id in self.get_all_projects():
-            messages_file = self._get_project_messages_file(project_id)
+        for project_id in project_ids:
             sessions_file = self._get_project_sessions_file(project_id)
             
-            project_size = 0
-            if messages_file.exists():
-                project_size += messages_file.stat().st_size
+            # Message size is the stored row content; the shared database file is counted below
+            message_count, project_size = self._count_messages(project_id)
             if sessions_file.exists():
                 project_size += sessions_file.stat().st_size
-            
-            total_size += project_size
+                total_size += sessions_file.stat().st_size
             
             stats['projects'][project_id] = {
                 'size_kb': round(project_size / 1024, 2),
-                'message_count': len(self.get_messages_for_project(project_id)),
+                'message_count': message_count,
                 'session_count': len(self.get_sessions_for_project(project_id))
             }
         
+        for db_file in self.messages_dir.glob("messages.db*"):
+            total_size += db_file.stat().st_size
+        
         stats['total_storage_mb'] = round(total_size / (1024 * 1024), 2)
         return stats
 
@@ -313,7 +634,7 @@ class DatabaseService:
 
     def load_project(self, project_id: str) -> Optional[Dict[str, Any]]:
         """Load project data from file"""
-        with self._lock:
+        with self._project_lock(project_id):
             project_file = self._get_project_file(project_id)
             if project_file.exists():
                 project = self._read_json_file(project_file)
@@ -323,6 +644,25 @@ class DatabaseService:
                 return project
             return None
 
+    def load_project_readonly(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Load project data, reusing the last parse while the file is unchanged; callers must not mutate the result"""
+        try:
+            stat = self._get_project_file(project_id).stat()
+        except FileNotFoundError:
+            self._project_cache.pop(project_id, None)
+            return None
+        
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._project_cache.get(project_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        # A rewrite racing this load only costs a re-parse: its new mtime misses next time
+        project = self.load_project(project_id)
+        if project:
+            self._project_cache[project_id] = (key, project)
+        return project
+
     def _ensure_project_fields(self, project: Dict[str, Any]) -> None:
         """Ensure project has all required fields with defaults"""
         project.setdefault('domain_documents', [])
@@ -335,11 +675,11 @@ class DatabaseService:
 
     def save_project(self, project: Dict[str, Any]) -> None:
         """Save project data to file"""
-        with self._lock:
-            project_id = project.get('id')
-            if not project_id:
-                raise ValueError("Project must have an 'id' field")
+        project_id = project.get('id')
+        if not project_id:
+            raise ValueError("Project must have an 'id' field")
 
+        with self._project_lock(project_id):
             project_file = self._get_project_file(project_id)
             self._write_json_file(project_file, project)
             print(f"💾 Saved project: {project_id}")
@@ -11,11 +11,215 @@ without any hardcoded assumptions about field names or structures.
 import re
 import json
 import logging
-from typing import Dict, Any, Optional, List, Tuple, Union
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple, Union, NamedTuple
 from datetime import datetime
 
+# orjson parses raw MQTT payloads several times faster than stdlib json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+# Optional: compiled scoring for analyze_batch
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
 logger = logging.getLogger(__name__)
 
+# Payload value types whose analysis can be memoized by value
+_CACHEABLE_VALUE_TYPES = (int, float, str, bool, type(None))
+
+# Payload value categories, dispatched on exact type (JSON decoding yields no subclasses)
+_NUMERIC, _STRING, _OBJECT, _ARRAY = 'numeric', 'string', 'object', 'array'
+_VALUE_KINDS = {int: _NUMERIC, float: _NUMERIC, bool: _NUMERIC, str: _STRING, dict: _OBJECT, list: _ARRAY}
+
+def _substring_re(*indicators: str) -> 're.Pattern':
+    """Compile a pattern matching any of the indicator substrings (one C-level scan per key)"""
+    return re.compile('|'.join(re.escape(indicator) for indicator in indicators))
+
+# Field-name indicators, matched against lowercased keys
+_ID_KEY_RE = _substring_re('id', 'device', 'equipment', 'node', 'unit', 'machine')
+_ID_SCORE_KEY_RE = _substring_re(
+    'id', 'device', 'equipment', 'node', 'unit', 'sensor', 'machine',
+    'name', 'label', 'tag', 'serial', 'address', 'handle', 'ref',
+    'equipment_id', 'device_id', 'sensor_id', 'cell_id'
+)
+_EXCLUDE_KEY_RE = _substring_re('id', 'time', 'stamp', 'date', 'count', 'index')
+_VALUE_KEY_RE = _substring_re(
+    'value', 'reading', 'measurement', 'level', 'amount', 'data',
+    'temperature', 'pressure', 'humidity', 'voltage', 'current', 'power',
+    'speed', 'flow', 'rate', 'count', 'percent', 'ratio', 'index',
+    'concentration', 'density', 'weight', 'mass', 'force', 'torque',
+    'ph', 'dissolved', 'viability', 'impedance', 'confluence'
+)
+_NON_VALUE_KEY_RE = _substring_re('id', 'time', 'stamp', 'date', 'version', 'count', 'index', 'key', 'hash')
+_DESC_KEY_RE = _substring_re('type', 'kind', 'category', 'class', 'name')
+_STATUS_KEY_RE = _substring_re('status', 'state', 'health', 'condition')
+_UNIT_KEY_RE = _substring_re('unit', 'units', 'uom', 'dimension', 'scale')
+_MIN_KEY_RE = _substring_re('min', 'minimum', 'lower', 'low')
+_MAX_KEY_RE = _substring_re('max', 'maximum', 'upper', 'high', 'limit')
+_SENSOR_TYPE_KEY_RE = _substring_re('sensor_type', 'type', 'kind', 'category', 'class')
+_TIME_KEY_RE = _substring_re('time', 'stamp', 'date')
+
+# Bit flags for what a field name suggests, computed once per distinct key by _classify_key
+_ID_BIT = 1 << 0
+_ID_SCORE_BIT = 1 << 1
+_EXCLUDE_BIT = 1 << 2
+_VALUE_BIT = 1 << 3
+_NON_VALUE_BIT = 1 << 4
+_DESC_BIT = 1 << 5
+_STATUS_BIT = 1 << 6
+_UNIT_BIT = 1 << 7
+_MIN_BIT = 1 << 8
+_MAX_BIT = 1 << 9
+_SENSOR_TYPE_BIT = 1 << 10
+_TIME_BIT = 1 << 11
+
+_KEY_PATTERNS = (
+    (_ID_BIT, _ID_KEY_RE),
+    (_ID_SCORE_BIT, _ID_SCORE_KEY_RE),
+    (_EXCLUDE_BIT, _EXCLUDE_KEY_RE),
+    (_VALUE_BIT, _VALUE_KEY_RE),
+    (_NON_VALUE_BIT, _NON_VALUE_KEY_RE),
+    (_DESC_BIT, _DESC_KEY_RE),
+    (_STATUS_BIT, _STATUS_KEY_RE),
+    (_UNIT_BIT, _UNIT_KEY_RE),
+    (_MIN_BIT, _MIN_KEY_RE),
+    (_MAX_BIT, _MAX_KEY_RE),
+    (_SENSOR_TYPE_BIT, _SENSOR_TYPE_KEY_RE),
+    (_TIME_BIT, _TIME_KEY_RE),
+)
+
+@lru_cache(maxsize=1024)
+def _classify_key(key: str) -> int:
+    """Bitmask of the indicator groups a field name matches (field names repeat, so this is memoized)"""
+    key_lower = key.lower()
+    flags = 0
+    for flag, pattern in _KEY_PATTERNS:
+        if pattern.search(key_lower):
+            flags |= flag
+    return flags
+
+if njit is not None:
+    # Compiled eagerly from the signature so the first batch pays no JIT warmup
+    @njit('float64[:](int64[:], float64[:])', cache=True)
+    def _score_main_values(flags, values):
+        """Vectorized _score_as_main_value for numeric fields (same arithmetic, same order)"""
+        n = len(values)
+        scores = np.empty(n)
+        for i in range(n):
+            score = 0.5
+            value = values[i]
+            if flags[i] & _VALUE_BIT:
+                score += 0.4
+            if -10000 <= value <= 100000:
+                score += 0.2
+            if 0 <= value <= 1000:
+                score += 0.1
+            if flags[i] & _NON_VALUE_BIT:
+                score -= 0.3
+            scores[i] = max(0.0, score)
+        return scores
+
+def _confidence_for(flags: int) -> float:
+    """Parsing confidence for a combination of the factors in _calculate_confidence's bitmask"""
+    confidence = 0.5  # Base confidence
+    
+    # Boost confidence based on topic structure
+    if flags & (1 << 0):  # depth >= 3
+        confidence += 0.2
+    elif flags & (1 << 1):  # depth == 2
+        confidence += 0.1
+    
+    # Boost confidence based on payload richness
+    if flags & (1 << 2):  # 3+ fields
+        confidence += 0.1
+    if flags & (1 << 3):  # has a main value candidate
+        confidence += 0.1
+    if flags & (1 << 4):  # has an identifier candidate
+        confidence += 0.1
+    
+    # Penalize if we had to use fallbacks
+    if flags & (1 << 5):  # equipment_id == 'device_unknown'
+        confidence -= 0.2
+    if flags & (1 << 6):  # sensor_type == 'sensor'
+        confidence -= 0.1
+    
+    return min(1.0, max(0.1, confidence))
+
+# Every combination precomputed, so scoring a message is a single lookup
+_CONFIDENCE_TABLE = tuple(_confidence_for(flags) for flags in range(1 << 7))
+
+# Deep topic, 3+ fields, main value and identifier: what the cell publisher's payloads score
+_CELL_CONFIDENCE = _CONFIDENCE_TABLE[0b11101]
+
+def _payload_fingerprint(payload: Dict[str, Any]) -> Tuple:
+    """Payload schema: ordered (field name, value type) pairs"""
+    return tuple(zip(payload, map(type, payload.values())))
+
+def _as_score_input(value) -> float:
+    """Numeric field value as a float64 for _score_main_values (huge ints become +/-inf)"""
+    try:
+        return float(value)
+    except OverflowError:
+        return float('inf') if value > 0 else float('-inf')
+
+# Characters whose presence (in a long enough string) suggests a datetime
+_DATETIME_CHAR_RE = re.compile(r'[-TZ:+]')
+
+class TopicInfo(NamedTuple):
+    """Parsed topic hierarchy; shared between messages, so treat as read-only"""
+    parts: Tuple[str, ...]
+    depth: int
+    last_part: str
+    second_last: Optional[str]
+    root: str
+    hierarchy: str
+    leaf: str
+
+@lru_cache(maxsize=512)
+def _parse_topic(topic: str) -> TopicInfo:
+    """Split a topic once; MQTT topics form a small, highly repetitive set"""
+    parts = tuple(topic.split('/'))
+    return TopicInfo(
+        parts=parts,
+        depth=len(parts),
+        last_part=parts[-1] if parts else 'unknown',
+        second_last=parts[-2] if len(parts) > 1 else None,
+        root=parts[0] if parts else 'unknown',
+        hierarchy='/'.join(parts[:-1]) if len(parts) > 1 else '',
+        leaf=parts[-1] if parts else 'unknown'
+    )
+
+class DisplayResult(NamedTuple):
+    """
+    Standardized display format for one analyzed message. Results may be served
+    from the analysis cache, so treat them (including metadata) as read-only.
+    """
+    equipment_id: str
+    sensor_type: str
+    value: Any
+    status: str
+    confidence: float
+    timestamp: Optional[str]
+    topic: str
+    metadata: Dict[str, Any]
+    raw_payload: Any
+    unit: str
+    display_name: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain dict form, for JSON serialization"""
+        return self._asdict()
+
 class AdaptiveSchemaLearner:
     """
     Universal MQTT message parser that intelligently extracts displayable information
@@ -23,108 +227,309 @@ class AdaptiveSchemaLearner:
     """
     
     def __init__(self):
-        self.message_history = {}  # Track patterns over time
+        # Message counts per (topic, payload fingerprint), least recently seen first
+        self.message_history = OrderedDict()
+        self.history_max = 10_000
         self.confidence_boost_per_occurrence = 0.1
-        
-    def analyze_message(self, payload: Dict[str, Any], topic: str) -> Dict[str, Any]:
+        # LRU of analysis results for repeated (topic, payload) pairs, most recent last
+        self._analysis_cache = OrderedDict()
+        self.analysis_cache_size = 4096
+        # Generated structure analyzers per payload schema: {fingerprint: function}
+        self._specialized = {}
+        self.specialize_after = 10  # messages with the same topic and schema before generating one
+        self.max_specialized = 256
+        
+    def analyze_message(self, payload: Dict[str, Any], topic: str, include_raw: bool = False) -> DisplayResult:
         """
         Universal analysis of any MQTT message structure.
         
         Returns a standardized display format that can be shown on any node,
-        regardless of the original message structure.
+        regardless of the original message structure. The original payload is
+        only attached as 'raw_payload' when include_raw is set.
         """
         try:
-            # Parse topic to extract hierarchical information
-            topic_info = self._parse_topic_hierarchy(topic)
-            
-            # Analyze payload structure to extract meaningful data
-            payload_info = self._analyze_payload_structure(payload)
+            if topic.startswith('cell/'):
+                result = self._analyze_cell_message(payload, topic, include_raw)
+                if result is not None:
+                    return result
             
-            # Combine and create a displayable result
-            result = self._create_display_format(topic_info, payload_info, payload, topic)
-            
-            # Track this pattern for future learning
-            self._track_message_pattern(topic, payload, result)
-            
-            logger.debug(f"Universal analysis: {topic} -> {result['equipment_id']}/{result['sensor_type']}")
-            return result
+            fingerprint = _payload_fingerprint(payload)
+            cache_key = self._analysis_cache_key(topic, payload)
+            cached = self._analysis_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                self._analysis_cache.move_to_end(cache_key)
+                result = cached
+            else:
+                result = self._analyze_uncached(payload, topic, cache_key, fingerprint)
+            return self._finish_result(result, payload, topic, fingerprint, include_raw)
             
         except Exception as e:
             logger.error(f"Error in universal message analysis: {e}")
-            return self._create_fallback_result(topic, payload)
+            return self._create_fallback_result(topic, payload, include_raw)
 
-    def _parse_topic_hierarchy(self, topic: str) -> Dict[str, Any]:
+    def analyze_raw(self, payload_bytes: Union[bytes, str], topic: str, include_raw: bool = False) -> DisplayResult:
         """
-        Parse topic hierarchy to understand the organizational structure.
-        Works with any topic pattern by analyzing the hierarchical relationships.
+        Parse a raw MQTT payload (e.g. msg.payload) and analyze it, skipping the
+        separate decode step. Malformed JSON raises the parser's error.
+        """
+        return self.analyze_message(_json_loads(payload_bytes), topic, include_raw)
+
+    def analyze_batch(self, payloads: List[Dict[str, Any]], topics: List[str],
+                      include_raw: bool = False) -> List[DisplayResult]:
+        """
+        Analyze a burst of messages; equivalent to calling analyze_message on each pair.
+        When numba is installed, numeric main-value scoring for all cache misses runs
+        in one compiled pass.
+        """
+        if njit is None:
+            return [self.analyze_message(payload, topic, include_raw) for payload, topic in zip(payloads, topics)]
+        
+        results = [None] * len(payloads)
+        misses = []  # (index, cache_key, fingerprint, first score slot, end slot)
+        flags = []
+        values = []
+        for i, (payload, topic) in enumerate(zip(payloads, topics)):
+            try:
+                if topic.startswith('cell/'):
+                    results[i] = self._analyze_cell_message(payload, topic, include_raw)
+                    if results[i] is not None:
+                        continue
+                
+                fingerprint = _payload_fingerprint(payload)
+                cache_key = self._analysis_cache_key(topic, payload)
+                cached = self._analysis_cache.get(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    self._analysis_cache.move_to_end(cache_key)
+                    results[i] = self._finish_result(cached, payload, topic, fingerprint, include_raw)
+                    continue
+                
+                # Queue this payload's main-value candidates for the compiled scorer
+                start = len(values)
+                for key, value in payload.items():
+                    if _VALUE_KINDS.get(type(value)) is _NUMERIC and not self._looks_like_id_or_timestamp(key, value):
+                        flags.append(_classify_key(key))
+                        values.append(_as_score_input(value))
+                misses.append((i, cache_key, fingerprint, start, len(values)))
+            except Exception as e:
+                logger.error(f"Error in universal message analysis: {e}")
+                results[i] = self._create_fallback_result(topic, payload, include_raw)
+        
+        scores = []
+        if values:
+            scores = _score_main_values(np.array(flags, dtype=np.int64), np.array(values, dtype=np.float64)).tolist()
+        
+        for i, cache_key, fingerprint, start, end in misses:
+            payload, topic = payloads[i], topics[i]
+            try:
+                result = self._analyze_uncached(payload, topic, cache_key, fingerprint, iter(scores[start:end]))
+                results[i] = self._finish_result(result, payload, topic, fingerprint, include_raw)
+            except Exception as e:
+                logger.error(f"Error in universal message analysis: {e}")
+                results[i] = self._create_fallback_result(topic, payload, include_raw)
+        
+        return results
+
+    def _analyze_cell_message(self, payload: Dict[str, Any], topic: str,
+                              include_raw: bool) -> Optional[DisplayResult]:
+        """
+        Fast path for the cell publisher's layout (cell/<cell_id>/<field> topics with a
+        numeric 'value', see data_gen/synthetic_data.py). Reads the known fields directly
+        instead of running the heuristics; returns None for anything else so the generic
+        analysis handles it. For publisher payloads the result matches the generic one.
         """
         parts = topic.split('/')
+        value = payload.get('value')
+        if len(parts) != 3 or type(value) not in (int, float):
+            return None
         
-        return {
-            'parts': parts,
-            'depth': len(parts),
-            'last_part': parts[-1] if parts else 'unknown',
-            'second_last': parts[-2] if len(parts) > 1 else None,
-            'root': parts[0] if parts else 'unknown',
-            'hierarchy': '/'.join(parts[:-1]) if len(parts) > 1 else '',
-            'leaf': parts[-1] if parts else 'unknown'
-        }
+        equipment_id = f"cell_{parts[1]}"
+        sensor_type = parts[2]
+        
+        metadata = {}
+        if 'unit' in payload:
+            metadata['unit'] = str(payload['unit'])
+        if type(payload.get('min_val')) in (int, float):
+            metadata['min_value'] = payload['min_val']
+        if type(payload.get('max_val')) in (int, float):
+            metadata['max_value'] = payload['max_val']
+        if type(payload.get('sensor_type')) is str:
+            metadata['sensor_type'] = payload['sensor_type']
+        
+        status = payload.get('status')
+        if type(status) is not str:
+            # Same inference as _determine_status
+            status = 'error' if value < 0 else 'idle' if value == 0 else 'active'
+        
+        timestamp = payload.get('timestamp')
+        if not self._looks_like_datetime(timestamp):
+            timestamp = datetime.now().isoformat()
+        
+        return DisplayResult(
+            equipment_id=equipment_id,
+            sensor_type=sensor_type,
+            value=value,
+            status=status,
+            confidence=_CELL_CONFIDENCE,
+            timestamp=timestamp,
+            topic=topic,
+            metadata=metadata,
+            raw_payload=payload if include_raw else None,
+            unit=metadata.get('unit', ''),
+            display_name=f"{equipment_id} {sensor_type}"
+        )
+
+    def _analyze_uncached(self, payload: Dict[str, Any], topic: str, cache_key: Optional[Tuple],
+                          fingerprint: Tuple, main_scores=None) -> DisplayResult:
+        """Run the full analysis and remember the result under cache_key (if any)"""
+        # Parse topic to extract hierarchical information
+        topic_info = self._parse_topic_hierarchy(topic)
+        
+        # Analyze payload structure to extract meaningful data, through the generated
+        # analyzer when this schema has been seen often enough to have one
+        specialized = self._specialized.get(fingerprint) if main_scores is None else None
+        if specialized is not None:
+            payload_info = specialized(payload)
+        else:
+            payload_info = self._analyze_payload_structure(payload, main_scores)
+        
+        # Combine and create a displayable result
+        result = self._create_display_format(topic_info, payload_info, payload, topic)
+        
+        if cache_key is not None:
+            self._analysis_cache[cache_key] = result
+            if len(self._analysis_cache) > self.analysis_cache_size:
+                self._analysis_cache.popitem(last=False)
+        return result
 
-    def _analyze_payload_structure(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _finish_result(self, result: DisplayResult, payload: Dict[str, Any], topic: str,
+                       fingerprint: Tuple, include_raw: bool) -> DisplayResult:
+        """Fill in per-message fields and record the pattern"""
+        # Per-message fields are never served from the cache
+        if include_raw or result.timestamp is None:
+            result = result._replace(
+                raw_payload=payload if include_raw else None,
+                timestamp=result.timestamp or datetime.now().isoformat()
+            )
+        
+        # Track this pattern for future learning
+        self._track_message_pattern(topic, fingerprint, result)
+        
+        logger.debug(f"Universal analysis: {topic} -> {result.equipment_id}/{result.sensor_type}")
+        return result
+
+    def _analysis_cache_key(self, topic: str, payload: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        Build a hashable key for the analysis cache, or None if the payload can't be cached.
+        Key order is kept since it decides ties between equally scored fields, and value
+        types are included so 1, 1.0 and True don't share an entry. Payloads holding
+        objects or arrays are not cached.
+        """
+        items = []
+        for key, value in payload.items():
+            if type(value) not in _CACHEABLE_VALUE_TYPES:
+                return None
+            items.append((key, type(value), value))
+        return (topic, tuple(items))
+
+    def clear_analysis_cache(self):
+        """Forget memoized analysis results."""
+        self._analysis_cache.clear()
+
+    def _parse_topic_hierarchy(self, topic: str) -> TopicInfo:
+        """
+        Parse topic hierarchy to understand the organizational structure.
+        Works with any topic pattern by analyzing the hierarchical relationships.
+        """
+        return _parse_topic(topic)
+
+    def _analyze_payload_structure(self, payload: Dict[str, Any], main_scores=None) -> Dict[str, Any]:
         """
         Analyze payload structure to understand what information is available.
         Uses intelligent heuristics rather than hardcoded field names.
+        main_scores optionally supplies precomputed main-value scores, in candidate order.
         """
         structure = {
-            'fields': list(payload.keys()),
             'field_count': len(payload),
             'numeric_fields': {},
             'string_fields': {},
             'datetime_fields': {},
             'object_fields': {},
-            'array_fields': {},
-            'main_value_candidates': [],
-            'identifier_candidates': [],
-            'description_candidates': []
+            'array_fields': {}
         }
+        # Only the top candidate of each kind is ever used, so keep a running
+        # max of (score, key, value) tuples; the first one wins ties
+        best_main = best_identifier = best_description = None
+        # First string that is neither an identifier nor a datetime
+        first_display_string = None
+        # Display metadata and timestamp are picked up in the same pass
+        metadata = {}
+        timestamp = None
         
         for key, value in payload.items():
+            flags = _classify_key(key)
+            
+            # Unit information: first unit-like field of any type
+            if flags & _UNIT_BIT and 'unit' not in metadata:
+                metadata['unit'] = str(value)
+            
             # Categorize by data type
-            if isinstance(value, (int, float)):
+            kind = _VALUE_KINDS.get(type(value))
+            if kind is _NUMERIC:
                 structure['numeric_fields'][key] = value
+                # Range information (the last matching field wins)
+                if flags & _MIN_BIT:
+                    metadata['min_value'] = value
+                elif flags & _MAX_BIT:
+                    metadata['max_value'] = value
                 # Numeric fields are often the main values to display
                 if not self._looks_like_id_or_timestamp(key, value):
-                    structure['main_value_candidates'].append({
-                        'key': key, 'value': value, 'score': self._score_as_main_value(key, value)
-                    })
-            elif isinstance(value, str):
+                    if main_scores is not None:
+                        score = next(main_scores)
+                    else:
+                        score = self._score_as_main_value(key, value)
+                    if best_main is None or score > best_main[0]:
+                        best_main = (score, key, value)
+            elif kind is _STRING:
                 structure['string_fields'][key] = value
+                if flags & _SENSOR_TYPE_BIT and 'sensor_type' not in metadata:
+                    metadata['sensor_type'] = value
+                if timestamp is None and flags & _TIME_BIT and self._looks_like_datetime(value):
+                    timestamp = value
                 if self._looks_like_identifier(key, value):
-                    structure['identifier_candidates'].append({
-                        'key': key, 'value': value, 'score': self._score_as_identifier(key, value)
-                    })
+                    score = self._score_as_identifier(key, value)
+                    if best_identifier is None or score > best_identifier[0]:
+                        best_identifier = (score, key, value)
                 elif self._looks_like_datetime(value):
                     structure['datetime_fields'][key] = value
                 else:
-                    structure['description_candidates'].append({
-                        'key': key, 'value': value, 'score': self._score_as_description(key, value)
-                    })
-            elif isinstance(value, dict):
+                    if first_display_string is None:
+                        first_display_string = value
+                    score = self._score_as_description(key, value)
+                    if best_description is None or score > best_description[0]:
+                        best_description = (score, key, value)
+            elif kind is _OBJECT:
                 structure['object_fields'][key] = value
-            elif isinstance(value, list):
+            elif kind is _ARRAY:
                 structure['array_fields'][key] = value
         
-        # Sort candidates by score
-        structure['main_value_candidates'].sort(key=lambda x: x['score'], reverse=True)
-        structure['identifier_candidates'].sort(key=lambda x: x['score'], reverse=True)
-        structure['description_candidates'].sort(key=lambda x: x['score'], reverse=True)
+        # Best candidates, or None when there were none of that kind
+        structure['best_main'] = best_main
+        structure['best_identifier'] = best_identifier
+        structure['best_description'] = best_description
+        structure['first_display_string'] = first_display_string
+        
+        # Note which nested objects exist (names only, so results don't pin large payloads)
+        if structure['object_fields']:
+            metadata['nested_keys'] = list(structure['object_fields'])
+        structure['metadata'] = metadata
+        structure['timestamp'] = timestamp
         
         return structure
 
-    def _create_display_format(self, topic_info: Dict[str, Any], 
+    def _create_display_format(self, topic_info: TopicInfo, 
                              payload_info: Dict[str, Any], 
                              payload: Dict[str, Any], 
-                             topic: str) -> Dict[str, Any]:
+                             topic: str) -> DisplayResult:
         """
         Create a standardized display format from the analyzed information.
         This is what will be shown on the monitoring node.
@@ -148,28 +553,28 @@ class AdaptiveSchemaLearner:
         # 6. Calculate confidence in our parsing
         confidence = self._calculate_confidence(topic_info, payload_info, equipment_id, sensor_type)
         
-        return {
-            'equipment_id': equipment_id,
-            'sensor_type': sensor_type,
-            'value': main_value,
-            'status': status,
-            'confidence': confidence,
-            'timestamp': self._extract_timestamp(payload),
-            'topic': topic,
-            'metadata': metadata,
-            'raw_payload': payload,
-            'unit': metadata.get('unit', ''),
-            'display_name': f"{equipment_id} {sensor_type}".strip()
-        }
+        return DisplayResult(
+            equipment_id=equipment_id,
+            sensor_type=sensor_type,
+            value=main_value,
+            status=status,
+            confidence=confidence,
+            timestamp=self._extract_timestamp(payload_info),  # None: stamped by analyze_message
+            topic=topic,
+            metadata=metadata,
+            raw_payload=None,  # attached by analyze_message when requested
+            unit=metadata.get('unit', ''),
+            display_name=f"{equipment_id} {sensor_type}".strip()
+        )
 
-    def _determine_equipment_id(self, topic_info: Dict[str, Any], 
+    def _determine_equipment_id(self, topic_info: TopicInfo, 
                                payload_info: Dict[str, Any], 
                                payload: Dict[str, Any]) -> str:
         """
         Intelligently determine what equipment/device this message represents.
         Works with any hierarchical topic pattern: <name>/<equipment>/<attribute>
         """
-        parts = topic_info['parts']
+        parts = topic_info.parts
         
         # For 3-level hierarchical topics (name/equipment/attribute)
         if len(parts) == 3:
@@ -186,13 +591,14 @@ class AdaptiveSchemaLearner:
                     return f"{equipment_type}_{equipment_id}"
         
         # Priority 2: Look for identifier-like fields in payload
-        if payload_info['identifier_candidates']:
-            best_id = payload_info['identifier_candidates'][0]
+        if payload_info['best_identifier'] is not None:
+            # Identifier candidates only come from string fields
+            best_id = payload_info['best_identifier'][2]
             # If we have numeric ID in payload, combine with topic root
-            if isinstance(best_id['value'], (int, str)) and str(best_id['value']).isdigit():
-                return f"{topic_info['root']}_{best_id['value']}"
+            if best_id.isdigit():
+                return f"{topic_info.root}_{best_id}"
             else:
-                return str(best_id['value'])
+                return best_id
         
         # Priority 3: Use topic hierarchy
         if len(parts) >= 2:
@@ -201,38 +607,37 @@ class AdaptiveSchemaLearner:
             return parts[0]
         
         # Fallback: generate from available data
-        return topic_info['root'] or 'device_unknown'
+        return topic_info.root or 'device_unknown'
 
-    def _determine_sensor_type(self, topic_info: Dict[str, Any], 
+    def _determine_sensor_type(self, topic_info: TopicInfo, 
                              payload_info: Dict[str, Any], 
                              payload: Dict[str, Any]) -> str:
         """
         Intelligently determine what type of measurement/sensor this represents.
         Works universally with any hierarchical topic pattern.
         """
-        parts = topic_info['parts']
+        parts = topic_info.parts
         
         # For 3-level hierarchical topics (name/equipment/attribute), use the last part as sensor type
         if len(parts) == 3:
             return parts[2]  # Always use the most specific part (attribute/measurement)
         
         # Priority 1: Last part of topic (most specific)
-        leaf = topic_info['leaf']
+        leaf = topic_info.leaf
         if leaf and not self._looks_like_identifier_in_topic(leaf):
             return leaf
         
         # Priority 2: Second to last part if last part looks like an ID
-        if topic_info['second_last'] and self._looks_like_identifier_in_topic(leaf):
-            return topic_info['second_last']
+        if topic_info.second_last and self._looks_like_identifier_in_topic(leaf):
+            return topic_info.second_last
         
         # Priority 3: Look for descriptive string fields in payload
-        if payload_info['description_candidates']:
-            best_desc = payload_info['description_candidates'][0]
-            return str(best_desc['value'])
+        if payload_info['best_description'] is not None:
+            return payload_info['best_description'][2]  # always a string field
         
         # Priority 4: Use the field name of the main value
-        if payload_info['main_value_candidates']:
-            return payload_info['main_value_candidates'][0]['key']
+        if payload_info['best_main'] is not None:
+            return payload_info['best_main'][1]
         
         # Fallback
         return 'sensor'
@@ -242,22 +647,20 @@ class AdaptiveSchemaLearner:
         Extract the main value that should be displayed prominently.
         """
         # Priority 1: Best scoring numeric value
-        if payload_info['main_value_candidates']:
-            return payload_info['main_value_candidates'][0]['value']
+        if payload_info['best_main'] is not None:
+            return payload_info['best_main'][2]
         
         # Priority 2: Any numeric value
         if payload_info['numeric_fields']:
-            return list(payload_info['numeric_fields'].values())[0]
+            return next(iter(payload_info['numeric_fields'].values()))
         
         # Priority 3: String values (but not identifiers or timestamps)
-        non_id_strings = [v for k, v in payload_info['string_fields'].items() 
-                         if not self._looks_like_identifier(k, v) and not self._looks_like_datetime(v)]
-        if non_id_strings:
-            return non_id_strings[0]
+        if payload_info['first_display_string'] is not None:
+            return payload_info['first_display_string']
         
         # Fallback: first available value
         if payload:
-            return list(payload.values())[0]
+            return next(iter(payload.values()))
         
         return None
 
@@ -267,8 +670,8 @@ class AdaptiveSchemaLearner:
         """
         # Look for explicit status-like fields
         for key, value in payload_info['string_fields'].items():
-            if any(indicator in key.lower() for indicator in ['status', 'state', 'health', 'condition']):
-                return str(value)
+            if _classify_key(key) & _STATUS_BIT:
+                return value
         
         # Infer status from main value if it's numeric
         if isinstance(main_value, (int, float)):
@@ -284,96 +687,39 @@ class AdaptiveSchemaLearner:
     def _extract_metadata(self, payload_info: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extract additional metadata that might be useful for display.
+        Collected during _analyze_payload_structure's pass over the payload.
         """
-        metadata = {}
-        
-        # Look for unit information (more comprehensive)
-        unit_indicators = ['unit', 'units', 'uom', 'dimension', 'scale']
-        for key, value in payload.items():
-            key_lower = key.lower()
-            if any(indicator in key_lower for indicator in unit_indicators):
-                metadata['unit'] = str(value)
-                break
-        
-        # Look for range information
-        range_indicators = {
-            'min': ['min', 'minimum', 'lower', 'low'],
-            'max': ['max', 'maximum', 'upper', 'high', 'limit']
-        }
-        
-        for key, value in payload.items():
-            key_lower = key.lower()
-            if isinstance(value, (int, float)):
-                # Check for min values
-                if any(indicator in key_lower for indicator in range_indicators['min']):
-                    metadata['min_value'] = value
-                # Check for max values
-                elif any(indicator in key_lower for indicator in range_indicators['max']):
-                    metadata['max_value'] = value
-        
-        # Extract sensor type information if available
-        sensor_type_indicators = ['sensor_type', 'type', 'kind', 'category', 'class']
-        for key, value in payload.items():
-            key_lower = key.lower()
-            if any(indicator in key_lower for indicator in sensor_type_indicators) and isinstance(value, str):
-                metadata['sensor_type'] = str(value)
-                break
-        
-        # Include any object fields as metadata
-        metadata.update(payload_info['object_fields'])
-        
-        return metadata
+        return payload_info['metadata']
 
-    def _extract_timestamp(self, payload: Dict[str, Any]) -> str:
+    def _extract_timestamp(self, payload_info: Dict[str, Any]) -> Optional[str]:
         """
-        Extract timestamp from payload, with fallback to current time.
+        Extract timestamp from payload, or None so the caller can fall back to current time.
+        Found during _analyze_payload_structure's pass over the payload.
         """
-        # Look for timestamp-like fields
-        for key, value in payload.items():
-            if any(indicator in key.lower() for indicator in ['time', 'stamp', 'date']):
-                if isinstance(value, str) and self._looks_like_datetime(value):
-                    return value
-        
-        # Fallback to current time
-        return datetime.now().isoformat()
+        return payload_info['timestamp']
 
-    def _calculate_confidence(self, topic_info: Dict[str, Any], 
+    def _calculate_confidence(self, topic_info: TopicInfo, 
                             payload_info: Dict[str, Any], 
                             equipment_id: str, 
                             sensor_type: str) -> float:
         """
         Calculate confidence in our parsing based on various factors.
         """
-        confidence = 0.5  # Base confidence
-        
-        # Boost confidence based on topic structure
-        if topic_info['depth'] >= 3:
-            confidence += 0.2
-        elif topic_info['depth'] == 2:
-            confidence += 0.1
-        
-        # Boost confidence based on payload richness
-        if payload_info['field_count'] >= 3:
-            confidence += 0.1
-        if payload_info['main_value_candidates']:
-            confidence += 0.1
-        if payload_info['identifier_candidates']:
-            confidence += 0.1
-        
-        # Penalize if we had to use fallbacks
-        if equipment_id == 'device_unknown':
-            confidence -= 0.2
-        if sensor_type == 'sensor':
-            confidence -= 0.1
-        
-        return min(1.0, max(0.1, confidence))
+        flags = (
+            (topic_info.depth >= 3) << 0
+            | (topic_info.depth == 2) << 1
+            | (payload_info['field_count'] >= 3) << 2
+            | (payload_info['best_main'] is not None) << 3
+            | (payload_info['best_identifier'] is not None) << 4
+            | (equipment_id == 'device_unknown') << 5
+            | (sensor_type == 'sensor') << 6
+        )
+        return _CONFIDENCE_TABLE[flags]
 
     # Helper methods for intelligent analysis
     def _looks_like_identifier(self, key: str, value: Any) -> bool:
         """Check if a field looks like an identifier."""
-        key_lower = key.lower()
-        id_indicators = ['id', 'device', 'equipment', 'node', 'unit', 'machine']
-        has_id_indicator = any(indicator in key_lower for indicator in id_indicators)
+        has_id_indicator = bool(_classify_key(key) & _ID_BIT)
         
         # Check value characteristics
         if isinstance(value, str):
@@ -397,29 +743,19 @@ class AdaptiveSchemaLearner:
         if not isinstance(value, str):
             return False
         # Simple heuristics for datetime strings
-        datetime_indicators = ['T', 'Z', ':', '-', '+']
-        return len(value) > 10 and any(indicator in value for indicator in datetime_indicators)
+        return len(value) > 10 and _DATETIME_CHAR_RE.search(value) is not None
 
     def _looks_like_id_or_timestamp(self, key: str, value: Any) -> bool:
         """Check if this field is likely an ID or timestamp (not a main value)."""
-        key_lower = key.lower()
-        exclude_indicators = ['id', 'time', 'stamp', 'date', 'count', 'index']
-        return any(indicator in key_lower for indicator in exclude_indicators)
+        return bool(_classify_key(key) & _EXCLUDE_BIT)
 
     def _score_as_main_value(self, key: str, value: Any) -> float:
         """Score how likely this field is to be the main display value."""
         score = 0.5
-        key_lower = key.lower()
+        flags = _classify_key(key)
         
         # Boost for value-like field names (more comprehensive)
-        value_indicators = [
-            'value', 'reading', 'measurement', 'level', 'amount', 'data',
-            'temperature', 'pressure', 'humidity', 'voltage', 'current', 'power',
-            'speed', 'flow', 'rate', 'count', 'percent', 'ratio', 'index',
-            'concentration', 'density', 'weight', 'mass', 'force', 'torque',
-            'ph', 'dissolved', 'viability', 'impedance', 'confluence'
-        ]
-        if any(indicator in key_lower for indicator in value_indicators):
+        if flags & _VALUE_BIT:
             score += 0.4
         
         # Boost for reasonable numeric ranges (expanded)
@@ -430,8 +766,7 @@ class AdaptiveSchemaLearner:
                 score += 0.1
         
         # Penalize fields that are clearly not main values
-        exclude_indicators = ['id', 'time', 'stamp', 'date', 'version', 'count', 'index', 'key', 'hash']
-        if any(indicator in key_lower for indicator in exclude_indicators):
+        if flags & _NON_VALUE_BIT:
             score -= 0.3
         
         return max(0.0, score)
@@ -439,15 +774,9 @@ class AdaptiveSchemaLearner:
     def _score_as_identifier(self, key: str, value: Any) -> float:
         """Score how likely this field is to be an identifier."""
         score = 0.3
-        key_lower = key.lower()
         
         # More comprehensive identifier indicators
-        id_indicators = [
-            'id', 'device', 'equipment', 'node', 'unit', 'sensor', 'machine',
-            'name', 'label', 'tag', 'serial', 'address', 'handle', 'ref',
-            'equipment_id', 'device_id', 'sensor_id', 'cell_id'
-        ]
-        if any(indicator in key_lower for indicator in id_indicators):
+        if _classify_key(key) & _ID_SCORE_BIT:
             score += 0.5
         
         # String characteristics for identifiers
@@ -467,31 +796,141 @@ class AdaptiveSchemaLearner:
     def _score_as_description(self, key: str, value: Any) -> float:
         """Score how likely this field is to be a description/type."""
         score = 0.2
-        key_lower = key.lower()
         
-        desc_indicators = ['type', 'kind', 'category', 'class', 'name']
-        if any(indicator in key_lower for indicator in desc_indicators):
+        if _classify_key(key) & _DESC_BIT:
             score += 0.3
         
         return score
 
-    def _track_message_pattern(self, topic: str, payload: Dict[str, Any], result: Dict[str, Any]):
-        """Track message patterns for learning (future enhancement)."""
-        # This could be used to improve parsing over time
-        pass
+    def _track_message_pattern(self, topic: str, fingerprint: Tuple, result: DisplayResult):
+        """Count messages per (topic, payload schema) and specialize schemas that keep recurring."""
+        pattern = (topic, fingerprint)
+        count = self.message_history.pop(pattern, 0) + 1
+        self.message_history[pattern] = count
+        if len(self.message_history) > self.history_max:
+            self.message_history.popitem(last=False)
+        
+        if (count == self.specialize_after and fingerprint
+                and fingerprint not in self._specialized
+                and len(self._specialized) < self.max_specialized):
+            self._specialized[fingerprint] = self._compile_structure_analyzer(fingerprint)
+            logger.debug(f"Specialized payload analysis for schema seen on {topic}")
+
+    def _compile_structure_analyzer(self, fingerprint: Tuple) -> Any:
+        """
+        Generate a _analyze_payload_structure equivalent for one payload schema
+        (ordered field names and value types). Everything that depends only on
+        field names or types is decided here, once, and the value-dependent
+        heuristics are inlined; keep them in sync with _looks_like_identifier,
+        _looks_like_datetime, _score_as_main_value and _score_as_identifier.
+        """
+        namespace = {'dt_search': _DATETIME_CHAR_RE.search}
+        names = ', '.join(f'v{i}' for i in range(len(fingerprint)))
+        lines = [
+            'def analyze(payload):',
+            f'    {names}, = payload.values()',
+            '    numeric_fields = {}; string_fields = {}; datetime_fields = {}',
+            '    object_fields = {}; array_fields = {}; metadata = {}',
+            '    best_main = best_identifier = best_description = None',
+            '    first_display_string = timestamp = None',
+        ]
+        have_unit = have_sensor_type = have_main = False
+        
+        for i, (key, value_type) in enumerate(fingerprint):
+            namespace[f'k{i}'] = key
+            k, v = f'k{i}', f'v{i}'
+            flags = _classify_key(key)
+            kind = _VALUE_KINDS.get(value_type)
+            looks_dt = f'len({v}) > 10 and dt_search({v}) is not None'
+            
+            if flags & _UNIT_BIT and not have_unit:
+                lines.append(f"    metadata['unit'] = str({v})")
+                have_unit = True
+            
+            if kind is _NUMERIC:
+                lines.append(f'    numeric_fields[{k}] = {v}')
+                if flags & _MIN_BIT:
+                    lines.append(f"    metadata['min_value'] = {v}")
+                elif flags & _MAX_BIT:
+                    lines.append(f"    metadata['max_value'] = {v}")
+                if not flags & _EXCLUDE_BIT:
+                    # _score_as_main_value, with the name-based boost folded in
+                    base = 0.5
+                    if flags & _VALUE_BIT:
+                        base += 0.4
+                    lines.append(f'    score = {base!r}')
+                    lines.append(f'    if -10000 <= {v} <= 100000: score += 0.2')
+                    lines.append(f'    if 0 <= {v} <= 1000: score += 0.1')
+                    if flags & _NON_VALUE_BIT:
+                        lines.append('    score -= 0.3')
+                        lines.append('    if score < 0.0: score = 0.0')
+                    if have_main:
+                        lines.append(f'    if score > best_main[0]: best_main = (score, {k}, {v})')
+                    else:
+                        lines.append(f'    best_main = (score, {k}, {v})')
+                    have_main = True
+            elif kind is _STRING:
+                lines.append(f'    string_fields[{k}] = {v}')
+                if flags & _SENSOR_TYPE_BIT and not have_sensor_type:
+                    lines.append(f"    metadata['sensor_type'] = {v}")
+                    have_sensor_type = True
+                if flags & _TIME_BIT:
+                    lines.append(f'    if timestamp is None and {looks_dt}: timestamp = {v}')
+                
+                # _score_as_identifier, with the name-based boost folded in
+                id_base = 0.3
+                if flags & _ID_SCORE_BIT:
+                    id_base += 0.5
+                identifier = [
+                    f'score = {id_base!r}',
+                    f"if len({v}) <= 30 and {v}.replace('_', '').replace('-', '').isalnum(): score += 0.3",
+                    f'if any(map(str.isdigit, {v})): score += 0.2',
+                    f'if best_identifier is None or score > best_identifier[0]: best_identifier = (score, {k}, {v})',
+                ]
+                if flags & _ID_BIT:
+                    # Identifier-like name: always an identifier candidate
+                    lines.extend('    ' + line for line in identifier)
+                else:
+                    desc_score = repr(self._score_as_description(key, None))
+                    lines.append(f"    if len({v}) <= 20 and ({v}.isalnum() or '_' in {v}):")
+                    lines.extend('        ' + line for line in identifier)
+                    lines.append(f'    elif {looks_dt}:')
+                    lines.append(f'        datetime_fields[{k}] = {v}')
+                    lines.append('    else:')
+                    lines.append(f'        if first_display_string is None: first_display_string = {v}')
+                    lines.append(f'        if best_description is None or {desc_score} > best_description[0]: '
+                                 f'best_description = ({desc_score}, {k}, {v})')
+            elif kind is _OBJECT:
+                lines.append(f'    object_fields[{k}] = {v}')
+            elif kind is _ARRAY:
+                lines.append(f'    array_fields[{k}] = {v}')
+        
+        if any(_VALUE_KINDS.get(value_type) is _OBJECT for _, value_type in fingerprint):
+            lines.append("    metadata['nested_keys'] = list(object_fields)")
+        lines.append(
+            f"    return {{'field_count': {len(fingerprint)}, 'numeric_fields': numeric_fields, "
+            "'string_fields': string_fields, 'datetime_fields': datetime_fields, "
+            "'object_fields': object_fields, 'array_fields': array_fields, "
+            "'best_main': best_main, 'best_identifier': best_identifier, "
+            "'best_description': best_description, 'first_display_string': first_display_string, "
+            "'metadata': metadata, 'timestamp': timestamp}"
+        )
+        
+        exec(compile('\n'.join(lines), f'<schema analyzer {len(self._specialized)}>', 'exec'), namespace)
+        return namespace['analyze']
 
-    def _create_fallback_result(self, topic: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_fallback_result(self, topic: str, payload: Dict[str, Any], include_raw: bool = False) -> DisplayResult:
         """Create a basic fallback result when analysis fails."""
-        return {
-            'equipment_id': topic.split('/')[0] if '/' in topic else 'unknown',
-            'sensor_type': topic.split('/')[-1] if '/' in topic else 'sensor',
-            'value': list(payload.values())[0] if payload else None,
-            'status': 'unknown',
-            'confidence': 0.1,
-            'timestamp': datetime.now().isoformat(),
-            'topic': topic,
-            'metadata': {},
-            'raw_payload': payload,
-            'unit': '',
-            'display_name': 'Unknown Device'
-        } 
\ No newline at end of file
+        return DisplayResult(
+            equipment_id=topic.split('/')[0] if '/' in topic else 'unknown',
+            sensor_type=topic.split('/')[-1] if '/' in topic else 'sensor',
+            value=next(iter(payload.values()), None),
+            status='unknown',
+            confidence=0.1,
+            timestamp=datetime.now().isoformat(),
+            topic=topic,
+            metadata={},
+            raw_payload=payload if include_raw else None,
+            unit='',
+            display_name='Unknown Device'
+        ) 
\ No newline at end of file
@@ -8,22 +8,31 @@ import logging
 import threading
 import time
 import os
+import re
 import uuid
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Set
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from database_service import db
 from alert_service import alert_service
-from vectorstore_service import vector_store
+from vectorstore_service import get_vector_store
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+# orjson parses MQTT payload bytes directly; fall back when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables from project root
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
@@ -38,6 +47,69 @@ except ImportError as e:
     print(f"Warning: Could not import AdaptiveSchemaLearner: {e}")
     AdaptiveSchemaLearner = None
 
+def _json_loads(data):
+    """json.loads for MQTT and WebSocket payloads (bytes or str), via orjson when available"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN, which stdlib json accepts
+    return json.loads(data)
+
+def _json_dumps(data) -> str:
+    """json.dumps for outgoing WebSocket messages, via orjson when available"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode('utf-8')
+        except orjson.JSONEncodeError:
+            pass  # e.g. non-string keys or types orjson does not serialize
+    return json.dumps(data)
+
+def _json_dumpb(data) -> bytes:
+    """_json_dumps as UTF-8 bytes, for binary WebSocket frames"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data).encode('utf-8')
+
+@lru_cache(maxsize=4096)
+def _unit_from_field(field: str) -> str:
+    """Unit suffix of a field name (e.g., "temperature_C" -> "C"); field names repeat, so this is memoized"""
+    return field.rsplit('_', 1)[-1] if '_' in field else ''
+
+class SensorReading:
+    """One analyzed monitoring reading, shared by the graph, alert check and database queue
+
+    Built once per message; slots keep the per-reading memory small and field access fast.
+    """
+    __slots__ = ('equipment_id', 'sensor_type', 'value', 'unit', 'status',
+                 'timestamp', 'topic', 'raw_payload')
+
+    def __init__(self, equipment_id: str, sensor_type: str, value: Any, unit: str,
+                 status: str, timestamp: str, topic: str, raw_payload: Any):
+        self.equipment_id = equipment_id
+        self.sensor_type = sensor_type
+        self.value = value
+        self.unit = unit
+        self.status = status
+        self.timestamp = timestamp
+        self.topic = topic
+        self.raw_payload = raw_payload
+
+    def to_message(self) -> Dict[str, Any]:
+        """Message dict in the form db.store_messages expects"""
+        return {
+            'equipment_id': self.equipment_id,
+            'sensor_type': self.sensor_type,
+            'value': self.value,
+            'status': self.status,
+            'timestamp': self.timestamp,
+            'topic': self.topic,
+            'raw_payload': self.raw_payload
+        }
+
 # Add this after the imports, before the FastAPI app definition
 
 class GraphDataManager:
@@ -45,74 +117,89 @@ class GraphDataManager:
     
     def __init__(self):
         self.nodes_data = {}  # {equipment_id: node_data}
-        self.sensor_data = {}  # {equipment_id: {sensor_type: sensor_reading}}
+        self.sensor_data = {}  # {equipment_id: {sensor_type: SensorReading}}
+        self.layout_nodes = {}  # {equipment_id: graph layout node}
+        self.sensor_index = {}  # {equipment_id: {sensor_type: position in the node's sensors list}}
         self.project = None
         self.last_update_time = 0  # Throttling
         self.update_interval = 0.5  # Send updates max every 500ms
+        # Encoded graph_update message, reused until the graph changes
+        self._graph_payload = b''
+        self._graph_dirty = True
+        # Monitoring workers update the graph while the event loop encodes it
+        self._lock = threading.Lock()
         
     def set_project(self, project):
         """Set the current project and initialize nodes from project data"""
-        self.project = project
-
-        # ALWAYS clear existing data when setting a new project
-        self.nodes_data = {}
-        self.sensor_data = {}
-
-        # Set up alert thresholds for the project
-        if project and project.get('alert_thresholds'):
-            alert_service.set_project_thresholds(project.get('id', ''), project['alert_thresholds'])
-
-        if project and project.get('graph_layout', {}).get('nodes'):
-            logger.info(f"🔍 GraphDataManager initializing with {len(project['graph_layout']['nodes'])} nodes from project")
-            for node in project['graph_layout']['nodes']:
-                equipment_id = node['data']['equipment_id']
-                logger.info(f"🔍 Initializing node: {equipment_id}")
-                self.nodes_data[equipment_id] = {
-                    'id': node['id'],
-                    'type': 'custom',
-                    'position': node['position'],
-                    'data': {
-                        **node['data'],
-                        'sensors': [],
-                        'status': 'idle',
-                        'last_updated': None
+        with self._lock:
+            self.project = project
+
+            # ALWAYS clear existing data when setting a new project
+            self.nodes_data = {}
+            self.sensor_data = {}
+            self.layout_nodes = {}
+            self.sensor_index = {}
+            self._graph_dirty = True
+
+            # Set up alert thresholds for the project
+            if project and project.get('alert_thresholds'):
+                alert_service.set_project_thresholds(project.get('id', ''), project['alert_thresholds'])
+
+            if project and project.get('graph_layout', {}).get('nodes'):
+                logger.info(f"🔍 GraphDataManager initializing with {len(project['graph_layout']['nodes'])} nodes from project")
+                for node in project['graph_layout']['nodes']:
+                    equipment_id = node['data']['equipment_id']
+                    logger.info(f"🔍 Initializing node: {equipment_id}")
+                    self.layout_nodes.setdefault(equipment_id, node)
+                    self.nodes_data[equipment_id] = {
+                        'id': node['id'],
+                        'type': 'custom',
+                        'position': node['position'],
+                        'data': {
+                            **node['data'],
+                            'sensors': [],
+                            'status': 'idle',
+                            'last_updated': None
+                        }
                     }
-                }
-                self.sensor_data[equipment_id] = {}
+                    self.sensor_data[equipment_id] = {}
+                    self.sensor_index[equipment_id] = {}
 
-            logger.info(f"🔍 GraphDataManager initialized with nodes: {list(self.nodes_data.keys())}")
-        else:
-            logger.info("🔍 No graph layout nodes found in project")
+                logger.info(f"🔍 GraphDataManager initialized with nodes: {list(self.nodes_data.keys())}")
+            else:
+                logger.info("🔍 No graph layout nodes found in project")
+    
+    def update_sensor_data(self, reading: SensorReading, now_iso: Optional[str] = None):
+        """Update sensor data for the reading's equipment and sensor type
+        
+        now_iso is the caller's timestamp for this message, reused for last_updated.
+        """
+        with self._lock:
+            self._apply_reading(reading, now_iso)
+    
+    def update_sensor_batch(self, readings: List[SensorReading], now_iso: Optional[str] = None):
+        """Apply several readings under one lock acquisition"""
+        with self._lock:
+            for reading in readings:
+                self._apply_reading(reading, now_iso)
     
-    def update_sensor_data(self, equipment_id: str, sensor_type: str, sensor_reading: dict):
-        """Update sensor data for a specific equipment and sensor type"""
+    def _apply_reading(self, reading: SensorReading, now_iso: Optional[str] = None):
+        """Record one reading on its node; caller holds the lock"""
+        equipment_id = reading.equipment_id
+        sensor_type = reading.sensor_type
         # Only process equipment that exists in the project's graph layout
         if equipment_id not in self.sensor_data:
             logger.debug(f"🔍 Equipment {equipment_id} not in sensor_data, checking if it's in graph layout")
             
-            # Check if this equipment is in the project's graph layout
-            if not self.project or not self.project.get('graph_layout', {}).get('nodes'):
-                logger.debug(f"🔍 No project or graph layout, skipping {equipment_id}")
-                return  # No project or no graph layout, skip
+            # Look up the original node data in the project's graph layout
+            original_node = self.layout_nodes.get(equipment_id)
             
-            # Check if this equipment_id is in the graph layout
-            equipment_in_layout = any(
-                node['data']['equipment_id'] == equipment_id 
-                for node in self.project['graph_layout']['nodes']
-            )
-            
-            if not equipment_in_layout:
+            if original_node is None:
                 logger.debug(f"🔍 Equipment {equipment_id} not in graph layout, skipping")
-                return  # Equipment not in graph layout, skip
+                return  # No project, no graph layout, or equipment not in it; skip
             
             logger.debug(f"🔍 Equipment {equipment_id} is in graph layout, creating node")
             
-            # Find the original node data from the graph layout
-            original_node = next(
-                node for node in self.project['graph_layout']['nodes']
-                if node['data']['equipment_id'] == equipment_id
-            )
-            
             # Create a new node using the original node data
             self.nodes_data[equipment_id] = {
                 'id': original_node['id'],
@@ -126,35 +213,44 @@ class GraphDataManager:
                 }
             }
             self.sensor_data[equipment_id] = {}
+            self.sensor_index[equipment_id] = {}
         
         # Update sensor data
-        self.sensor_data[equipment_id][sensor_type] = sensor_reading
+        self.sensor_data[equipment_id][sensor_type] = reading
         
-        # Rebuild sensors array for the node
-        sensors = []
-        for stype, sreading in self.sensor_data[equipment_id].items():
-            sensors.append({
-                'sensor_type': stype,
-                'value': sreading.get('value', 0),
-                'unit': sreading.get('unit', ''),
-                'timestamp': sreading.get('timestamp'),
-                'status': sreading.get('status', 'active')
-            })
+        # Update this sensor's entry in the node's sensors array in place
+        node_data = self.nodes_data[equipment_id]['data']
+        sensors = node_data['sensors']
+        sensor_entry = {
+            'sensor_type': sensor_type,
+            'value': reading.value,
+            'unit': reading.unit,
+            'timestamp': reading.timestamp,
+            'status': reading.status
+        }
+        positions = self.sensor_index[equipment_id]
+        position = positions.get(sensor_type)
+        if position is None:
+            positions[sensor_type] = len(sensors)
+            sensors.append(sensor_entry)
+        else:
+            sensors[position] = sensor_entry
         
         # Update node data
-        self.nodes_data[equipment_id]['data']['sensors'] = sensors
-        self.nodes_data[equipment_id]['data']['status'] = 'active' if sensors else 'idle'
-        self.nodes_data[equipment_id]['data']['last_updated'] = datetime.now().isoformat()
-    
+        node_data['status'] = 'active'
+        node_data['last_updated'] = now_iso or datetime.now().isoformat()
+        self._graph_dirty = True
+
     def should_send_update(self):
         """Check if enough time has passed to send an update"""
-        current_time = time.time()
-        if current_time - self.last_update_time >= self.update_interval:
-            self.last_update_time = current_time
-            return True
-        return False
+        with self._lock:
+            current_time = time.time()
+            if current_time - self.last_update_time >= self.update_interval:
+                self.last_update_time = current_time
+                return True
+            return False
     
-    def get_graph_data(self):
+    def get_graph_data(self, now_iso: Optional[str] = None):
         """Get complete graph data with all nodes and their sensor data"""
         nodes = list(self.nodes_data.values())
         edges = []
@@ -168,9 +264,17 @@ class GraphDataManager:
         return {
             'nodes': nodes,
             'edges': edges,
-            'last_updated': datetime.now().isoformat(),
+            'last_updated': now_iso or datetime.now().isoformat(),
             'first_message': len(nodes) > 0
         }
+    
+    def get_graph_update_payload(self) -> bytes:
+        """Encoded graph_update message, rebuilt only if the graph changed since the last call"""
+        with self._lock:
+            if self._graph_dirty or not self._graph_payload:
+                self._graph_payload = _json_dumpb({'type': 'graph_update', 'data': self.get_graph_data()})
+                self._graph_dirty = False
+            return self._graph_payload
 
 # Create global graph data manager
 graph_manager = GraphDataManager()
@@ -213,11 +317,31 @@ class DiscoveredNode(BaseModel):
 current_discovery: Optional['MQTTDiscovery'] = None
 current_monitoring: Optional['MQTTMonitoring'] = None
 discovered_nodes: List[DiscoveredNode] = []
-connected_websockets: List[WebSocket] = []
+connected_websockets: Set[WebSocket] = set()
 
 # Event loop for handling async tasks from sync contexts
 main_loop: Optional[asyncio.AbstractEventLoop] = None
 
+# Outgoing WebSocket messages, appended by MQTT threads and drained by the broadcaster
+# task started at startup; bounded so a stalled loop drops the oldest instead of growing
+BROADCAST_BUFFER_SIZE = 10000
+broadcast_buffer: deque = deque(maxlen=BROADCAST_BUFFER_SIZE)
+broadcast_ready: Optional[asyncio.Event] = None
+# Several monitoring workers enqueue at once; the append and the wakeup check must not interleave
+broadcast_lock = threading.Lock()
+broadcaster_task: Optional[asyncio.Task] = None
+# Queued in place of a graph snapshot; the broadcaster sends graph_manager's current graph
+GRAPH_UPDATE = {'type': 'graph_update'}
+# Clients sent to per gather before yielding back to the event loop
+BROADCAST_BATCH_SIZE = 50
+
+# Received MQTT messages buffered per monitoring worker before processing
+MONITOR_INBOX_SIZE = 10000
+# Most messages a monitoring worker takes from its inbox per pass
+MONITOR_BATCH_SIZE = 1024
+# Threads processing monitored MQTT messages, each owning a share of the topics
+MONITOR_WORKERS = max(1, int(os.getenv("MQTT_MONITOR_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
 class MQTTDiscovery:
     """Handles MQTT topic discovery"""
     
@@ -225,7 +349,7 @@ class MQTTDiscovery:
         self.config = config
         self.client = None
         self.is_running = False
-        self.discovered_data = {}
+        self.equipment_groups = {}  # {equipment_id: group}, updated per message
         self.schema_learner = AdaptiveSchemaLearner() if AdaptiveSchemaLearner else None
         
     def on_connect(self, client, userdata, flags, rc):
@@ -248,23 +372,16 @@ class MQTTDiscovery:
     def on_message(self, client, userdata, msg):
         try:
             topic = msg.topic
-            payload = json.loads(msg.payload.decode())
+            payload = _json_loads(msg.payload)
             
             if self.schema_learner:
                 # Use the adaptive schema learner to analyze the message
                 analyzed = self.schema_learner.analyze_message(payload, topic)
-                equipment_id = analyzed.get('equipment_id', 'unknown')
-                sensor_type = analyzed.get('sensor_type', 'unknown')
+                equipment_id = analyzed.equipment_id
+                sensor_type = analyzed.sensor_type
                 
                 if equipment_id != 'unknown' and sensor_type != 'unknown':
-                    key = f"{equipment_id}_{sensor_type}"
-                    self.discovered_data[key] = {
-                        'equipment_id': equipment_id,
-                        'sensor_type': sensor_type,
-                        'topic': topic,
-                        'last_seen': datetime.now().isoformat(),
-                        'sample_data': payload
-                    }
+                    self._update_equipment_group(equipment_id, sensor_type, topic, payload)
                     logger.debug(f"Discovered: {equipment_id} / {sensor_type} on topic {topic}")
             else:
                 logger.warning("AdaptiveSchemaLearner not available for discovery")
@@ -272,6 +389,44 @@ class MQTTDiscovery:
         except Exception as e:
             logger.error(f"Error processing discovery message: {e}")
     
+    def _update_equipment_group(self, equipment_id: str, sensor_type: str, topic: str, payload: dict):
+        """Fold one discovered reading into its equipment group"""
+        now = datetime.now().isoformat()
+        group = self.equipment_groups.get(equipment_id)
+        if group is None:
+            group = self.equipment_groups[equipment_id] = {
+                'equipment_id': equipment_id,
+                'equipment_type': sensor_type,
+                'topics': {},  # Insertion-ordered set
+                'sensor_types': set(),
+                'sample_sensor_type': sensor_type,
+                'sample_data': payload,
+                'message_count': 0,
+                'first_seen': now,
+                'last_seen': now
+            }
+        
+        group['topics'][topic] = None
+        group['last_seen'] = now
+        if sensor_type == group['sample_sensor_type']:
+            # Sample data is the latest payload of the first sensor seen
+            group['sample_data'] = payload
+        
+        if sensor_type not in group['sensor_types']:
+            # Counts distinct sensor streams per equipment
+            group['sensor_types'].add(sensor_type)
+            group['message_count'] += 1
+            
+            # Dynamically infer equipment type from equipment_id or topic structure
+            if '_' in equipment_id:
+                # Extract the base name from equipment_id (e.g., "cell_1" -> "cell", "lab_furnace01" -> "lab")
+                equipment_base = equipment_id.split('_')[0].lower()
+            else:
+                # Use the root topic as equipment type for single-level equipment IDs
+                topic_parts = topic.split('/')
+                equipment_base = topic_parts[0].lower() if topic_parts else equipment_id.lower()
+            group['equipment_type'] = equipment_base
+    
 
     
     def start(self):
@@ -298,49 +453,14 @@ class MQTTDiscovery:
             self.is_running = False
     
     def get_discovered_nodes(self) -> List[DiscoveredNode]:
-        # Group by equipment_id to create equipment-based nodes
-        equipment_groups = {}
-        
-        for data in self.discovered_data.values():
-            equipment_id = data['equipment_id']
-            
-            if equipment_id not in equipment_groups:
-                equipment_groups[equipment_id] = {
-                    'equipment_id': equipment_id,
-                    'equipment_type': data['sensor_type'],  # Use first sensor type as equipment type
-                    'topics': [],
-                    'sample_data': data['sample_data'],
-                    'message_count': 0,
-                    'first_seen': data['last_seen'],
-                    'last_seen': data['last_seen']
-                }
-            
-            # Update the group data
-            group = equipment_groups[equipment_id]
-            if data['topic'] not in group['topics']:
-                group['topics'].append(data['topic'])
-            group['message_count'] += 1
-            group['last_seen'] = max(group['last_seen'], data['last_seen'])
-            group['first_seen'] = min(group['first_seen'], data['last_seen'])
-            
-            # Dynamically infer equipment type from equipment_id or topic structure
-            if '_' in equipment_id:
-                # Extract the base name from equipment_id (e.g., "cell_1" -> "cell", "lab_furnace01" -> "lab")
-                equipment_base = equipment_id.split('_')[0].lower()
-            else:
-                # Use the root topic as equipment type for single-level equipment IDs
-                topic_parts = data['topic'].split('/')
-                equipment_base = topic_parts[0].lower() if topic_parts else equipment_id.lower()
-            group['equipment_type'] = equipment_base
-        
-        # Convert to DiscoveredNode objects
+        # Groups are maintained by on_message; convert a snapshot to DiscoveredNode objects
         nodes = []
-        for group in equipment_groups.values():
+        for group in list(self.equipment_groups.values()):
             nodes.append(DiscoveredNode(
                 id=f"node_{group['equipment_id']}",
                 equipment_id=group['equipment_id'],
                 equipment_type=group['equipment_type'],
-                topics=group['topics'],
+                topics=list(group['topics']),
                 sample_data=group['sample_data'],
                 message_count=group['message_count'],
                 first_seen=group['first_seen'],
@@ -356,10 +476,25 @@ class MQTTMonitoring:
         self.config = config
         self.client = None
         self.is_running = False
-        self.schema_learner = AdaptiveSchemaLearner() if AdaptiveSchemaLearner else None
+        # One schema learner per worker thread, so their caches need no lock. Topics are
+        # sharded across workers and the learner's history is per topic, so nothing is lost
+        self._tls = threading.local()
         self.current_session_id = None
         self.project_id = None
         
+        # Paho's network thread only buffers messages; worker threads process them.
+        # Each worker owns one inbox and topics are routed by hash, so readings for a
+        # topic stay in order. Bounded so a slow handler drops the oldest messages
+        # instead of growing memory
+        self._inboxes = [deque(maxlen=MONITOR_INBOX_SIZE) for _ in range(MONITOR_WORKERS)]
+        self._inbox_ready = [threading.Event() for _ in range(MONITOR_WORKERS)]
+        self._workers = []
+        self._worker_running = False
+        self.dropped_count = 0
+        # Per worker, each slot written only by its own thread
+        self._processed = [0] * MONITOR_WORKERS
+        self._handler_seconds = [0.0] * MONITOR_WORKERS
+        
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logger.info(f"Connected to MQTT broker for monitoring")
@@ -378,93 +513,147 @@ class MQTTMonitoring:
             logger.error(f"Failed to connect to MQTT broker: {rc}")
     
     def on_message(self, client, userdata, msg):
-        try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
-            
-            if self.schema_learner:
-                # Extract data using schema learner
-                analyzed = self.schema_learner.analyze_message(payload, topic)
-                equipment_id = analyzed.get('equipment_id', 'unknown')
-                sensor_type = analyzed.get('sensor_type', 'unknown')
-                value = analyzed.get('value')
-                status = analyzed.get('status', 'active')
-            else:
-                logger.warning("AdaptiveSchemaLearner not available for monitoring")
-                equipment_id = 'unknown'
-                sensor_type = 'unknown'
-                value = payload.get('value', 0)
-                status = payload.get('status', 'active')
-            
-            if equipment_id != 'unknown':
+        topic = msg.topic
+        worker = hash(topic) % MONITOR_WORKERS
+        inbox = self._inboxes[worker]
+        if len(inbox) == inbox.maxlen:
+            self.dropped_count += 1  # append below evicts the oldest
+        inbox.append((topic, msg.payload))
+        # Only the empty -> non-empty transition needs to wake the worker
+        if len(inbox) == 1:
+            self._inbox_ready[worker].set()
+    
+    def _process_inbox(self, worker: int):
+        """Worker thread: handle one inbox's messages in arrival order, in batches, draining on stop"""
+        inbox = self._inboxes[worker]
+        ready = self._inbox_ready[worker]
+        while self._worker_running or inbox:
+            ready.wait(0.1)
+            ready.clear()
+            while inbox:
+                batch = [inbox.popleft() for _ in range(min(len(inbox), MONITOR_BATCH_SIZE))]
+                started = time.perf_counter()
+                try:
+                    self._process_batch(batch)
+                except Exception as e:
+                    # Never let one batch end the worker; its topics would go unprocessed
+                    logger.error(f"Error processing monitoring batch: {e}")
+                self._handler_seconds[worker] += time.perf_counter() - started
+                self._processed[worker] += len(batch)
+    
+    def _get_learner(self):
+        """This worker thread's AdaptiveSchemaLearner, created on first use"""
+        learner = getattr(self._tls, 'learner', None)
+        if learner is None and AdaptiveSchemaLearner:
+            learner = self._tls.learner = AdaptiveSchemaLearner()
+        return learner
+    
+    def _process_batch(self, batch: List[tuple]):
+        """Handle a burst of (topic, raw payload) messages in one pass over shared state"""
+        payloads = []
+        topics = []
+        for topic, raw_payload in batch:
+            try:
+                payload = _json_loads(raw_payload)
+            except Exception as e:
+                logger.error(f"Error processing monitoring message: {e}")
+                continue
+            # Sensor readings are JSON objects; the learner cannot analyze 42, [1, 2] or "x"
+            if not isinstance(payload, dict):
+                logger.error(f"Error processing monitoring message: payload on {topic} is not a JSON object")
+                continue
+            payloads.append(payload)
+            topics.append(topic)
+        if not payloads:
+            return
+        
+        schema_learner = self._get_learner()
+        if schema_learner:
+            # Extract data using schema learner
+            try:
+                analyzed_batch = schema_learner.analyze_batch(payloads, topics)
+            except Exception as e:
+                # Retry one by one so a single bad message does not lose the whole batch
+                logger.error(f"Error analyzing monitoring batch: {e}")
+                analyzed_batch = []
+                for payload, topic in zip(payloads, topics):
+                    try:
+                        analyzed_batch.append(schema_learner.analyze_message(payload, topic))
+                    except Exception as e:
+                        logger.error(f"Error processing monitoring message: {e}")
+                        analyzed_batch.append(None)
+        else:
+            logger.warning("AdaptiveSchemaLearner not available for monitoring")
+            analyzed_batch = [None] * len(payloads)
+        
+        # One timestamp for everything derived from this batch
+        now_iso = datetime.now().isoformat()
+        project_id = self.project_id
+        session_id = self.current_session_id
+        readings = []
+        
+        for payload, topic, analyzed in zip(payloads, topics, analyzed_batch):
+            try:
+                if analyzed is not None:
+                    equipment_id = analyzed.equipment_id
+                    sensor_type = analyzed.sensor_type
+                    value = analyzed.value
+                    status = analyzed.status
+                else:
+                    equipment_id = 'unknown'
+                    sensor_type = 'unknown'
+                    value = payload.get('value', 0)
+                    status = payload.get('status', 'active')
+                
+                if equipment_id == 'unknown':
+                    continue
+                
                 # Get unit from payload or schema learner
                 unit = payload.get('unit', '')
-                if not unit and 'field' in payload:
+                if not unit:
                     # Extract unit from field name (e.g., "temperature_C" -> "C")
-                    field = payload.get('field', '')
-                    if '_' in field:
-                        unit = field.split('_')[-1]
+                    field = payload.get('field')
+                    if isinstance(field, str):
+                        unit = _unit_from_field(field)
                 
-                # Update graph manager with sensor data
-                sensor_reading = {
-                    'value': value,
-                    'unit': unit,
-                    'status': status,
-                    'timestamp': datetime.now().isoformat(),
-                    'topic': topic,
-                    'raw_payload': payload
-                }
+                readings.append(SensorReading(
+                    equipment_id, sensor_type, value, unit, status, now_iso, topic, payload
+                ))
                 
-                graph_manager.update_sensor_data(equipment_id, sensor_type, sensor_reading)
-
                 # Evaluate sensor reading against alert thresholds
                 alert = alert_service.evaluate_sensor_reading(
                     equipment_id, sensor_type, value, topic,
-                    datetime.now().isoformat(), self.project_id or ''
+                    now_iso, project_id or ''
                 )
-
-                # Only send graph updates if enough time has passed (throttling)
-                if graph_manager.should_send_update():
-                    graph_data = graph_manager.get_graph_data()
-                    message = {
-                        'type': 'graph_update',
-                        'data': graph_data
-                    }
-
-                    # Send to all connected WebSocket clients - use thread-safe approach
-                    if main_loop and not main_loop.is_closed():
-                        asyncio.run_coroutine_threadsafe(broadcast_to_websockets(message), main_loop)
-
+                
                 # Send alert updates immediately (not throttled)
                 if alert:
-                    alert_message = {
+                    enqueue_broadcast({
                         'type': 'alert_update',
                         'data': alert
-                    }
-
-                    # Send alert to all connected WebSocket clients
-                    if main_loop and not main_loop.is_closed():
-                        asyncio.run_coroutine_threadsafe(broadcast_to_websockets(alert_message), main_loop)
-                    
-                # Store message in database if session is active
-                if self.current_session_id and self.project_id:
-                    try:
-                        db.store_message(self.project_id, self.current_session_id, {
-                            'equipment_id': equipment_id,
-                            'sensor_type': sensor_type,
-                            'value': value,
-                            'status': status,
-                            'timestamp': datetime.now().isoformat(),
-                            'topic': topic,
-                            'raw_payload': payload
-                        })
-                    except Exception as e:
-                        logger.error(f"Failed to store message in database: {e}")
-            
-        except Exception as e:
-            logger.error(f"Error processing monitoring message: {e}")
-    
-
+                    })
+            except Exception as e:
+                logger.error(f"Error processing monitoring message: {e}")
+        
+        if readings:
+            try:
+                # Update graph manager with sensor data
+                graph_manager.update_sensor_batch(readings, now_iso)
+                
+                # Only send graph updates if enough time has passed (throttling)
+                if graph_manager.should_send_update():
+                    # Send to all connected WebSocket clients - use thread-safe approach;
+                    # the graph is snapshotted and encoded when the broadcaster sends it
+                    enqueue_broadcast(GRAPH_UPDATE)
+            except Exception as e:
+                logger.error(f"Error updating graph with monitoring batch: {e}")
+        
+        # Store messages in database if session is active
+        if readings and session_id and project_id:
+            try:
+                db.store_messages(project_id, session_id, [reading.to_message() for reading in readings])
+            except Exception as e:
+                logger.error(f"Failed to store messages in database: {e}")
     
     def start(self):
         try:
@@ -477,6 +666,14 @@ class MQTTMonitoring:
             
             self.client.connect(self.config.broker_host, self.config.broker_port, 60)
             self.is_running = True
+            self._worker_running = True
+            self._workers = [
+                threading.Thread(target=self._process_inbox, args=(worker,),
+                                 name=f"mqtt-monitor-worker-{worker}", daemon=True)
+                for worker in range(MONITOR_WORKERS)
+            ]
+            for thread in self._workers:
+                thread.start()
             self.client.loop_start()
             
         except Exception as e:
@@ -499,28 +696,98 @@ class MQTTMonitoring:
             self.project_id = None
 
     def stop(self):
-        # Stop recording session if active
-        self.stop_recording_session()
-        
         if self.client and self.is_running:
             self.client.loop_stop()
             self.client.disconnect()
             self.is_running = False
+        
+        # Let the workers finish buffered messages so they reach the recording session
+        self._worker_running = False
+        for ready in self._inbox_ready:
+            ready.set()
+        for thread in self._workers:
+            thread.join(timeout=5)
+        self._workers = []
+        
+        # Stop recording session if active
+        self.stop_recording_session()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Receive-buffer statistics"""
+        processed = sum(self._processed)
+        return {
+            'workers': MONITOR_WORKERS,
+            'queue_depth': sum(len(inbox) for inbox in self._inboxes),
+            'queue_capacity': MONITOR_INBOX_SIZE * MONITOR_WORKERS,
+            'dropped_count': self.dropped_count,
+            'processed_count': processed,
+            'avg_handler_ms': (sum(self._handler_seconds) / processed * 1000) if processed else 0.0
+        }
+
+def enqueue_broadcast(message: dict):
+    """Queue a message for all WebSocket clients; safe to call from MQTT threads"""
+    if main_loop and not main_loop.is_closed() and broadcast_ready is not None:
+        # Only the empty -> non-empty transition needs to wake the loop; anything
+        # appended while the broadcaster drains is picked up by that same drain.
+        # Monitoring worker threads call this concurrently, so the append and the
+        # length check happen together under the lock
+        with broadcast_lock:
+            broadcast_buffer.append(message)
+            wake = len(broadcast_buffer) == 1
+        if wake:
+            main_loop.call_soon_threadsafe(broadcast_ready.set)
 
 async def broadcast_to_websockets(message: dict):
     """Broadcast message to all connected WebSocket clients"""
     if connected_websockets:
+        # Serialize and encode once, send to every client concurrently as a binary frame
+        if message is GRAPH_UPDATE:
+            payload = graph_manager.get_graph_update_payload()
+        else:
+            payload = _json_dumpb(message)
+        clients = tuple(connected_websockets)
         disconnected = []
-        for websocket in connected_websockets:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending to WebSocket: {e}")
-                disconnected.append(websocket)
+        for start in range(0, len(clients), BROADCAST_BATCH_SIZE):
+            if start:
+                await asyncio.sleep(0)  # Let other tasks run between large batches
+            batch = clients[start:start + BROADCAST_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(websocket.send_bytes(payload) for websocket in batch),
+                return_exceptions=True
+            )
+            for websocket, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error sending to WebSocket: {result}")
+                    disconnected.append(websocket)
         
         # Remove disconnected WebSockets
-        for ws in disconnected:
-            connected_websockets.remove(ws)
+        connected_websockets.difference_update(disconnected)
+
+async def broadcaster():
+    """Drain the broadcast buffer, sending only the newest of any pending graph updates"""
+    while True:
+        await broadcast_ready.wait()
+        broadcast_ready.clear()
+        pending = []
+        while broadcast_buffer:
+            pending.append(broadcast_buffer.popleft())
+        
+        # Each graph_update is a full snapshot, so older queued ones are stale;
+        # alerts are all delivered, in order
+        messages = []
+        seen_graph_update = False
+        for message in reversed(pending):
+            if message.get('type') == 'graph_update':
+                if seen_graph_update:
+                    continue
+                seen_graph_update = True
+            messages.append(message)
+        
+        for message in reversed(messages):
+            try:
+                await broadcast_to_websockets(message)
+            except Exception as e:
+                logger.error(f"Error broadcasting to WebSockets: {e}")
 
 # API Routes
 @app.post("/api/mqtt/test")
@@ -584,6 +851,13 @@ async def get_discovery_status():
             "count": len(discovered_nodes)
         }
 
+@app.get("/api/mqtt/monitoring/stats")
+async def get_monitoring_stats():
+    """Get receive-buffer statistics for the active MQTT monitoring session"""
+    if current_monitoring and current_monitoring.is_running:
+        return {"status": "running", **current_monitoring.get_stats()}
+    return {"status": "stopped"}
+
 @app.post("/api/mqtt/discovery/stop")
 async def stop_mqtt_discovery():
     """Stop MQTT discovery"""
@@ -611,14 +885,14 @@ async def clear_discovered_nodes():
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    connected_websockets.append(websocket)
+    connected_websockets.add(websocket)
     logger.info(f"WebSocket client connected. Total clients: {len(connected_websockets)}")
     
     try:
         while True:
             # Wait for messages from client
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = _json_loads(data)
             
             if message.get('type') == 'start_monitoring':
                 # Start MQTT monitoring
@@ -655,7 +929,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         
                         logger.info(f"🎬 Backend monitoring linked to recording session: {session_id}")
                     
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_text(_json_dumps({
                         'type': 'monitoring_started',
                         'message': 'MQTT monitoring started successfully',
                         'recording_session': session_info.get('session_id') if session_info else None
@@ -667,18 +941,17 @@ async def websocket_endpoint(websocket: WebSocket):
                     current_monitoring.stop()
                     current_monitoring = None
                 
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(_json_dumps({
                     'type': 'monitoring_stopped',
                     'message': 'MQTT monitoring stopped'
                 }))
                 
     except WebSocketDisconnect:
-        connected_websockets.remove(websocket)
+        connected_websockets.discard(websocket)
         logger.info(f"WebSocket client disconnected. Total clients: {len(connected_websockets)}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        if websocket in connected_websockets:
-            connected_websockets.remove(websocket)
+        connected_websockets.discard(websocket)
 
 # Database API Endpoints
 @app.post("/api/database/session/start")
@@ -728,19 +1001,22 @@ async def store_message(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/database/messages/{project_id}")
-async def get_project_messages(project_id: str, limit: Optional[int] = None):
-    """Get all messages for a project"""
+async def get_project_messages(project_id: str, limit: Optional[int] = None,
+                               since: Optional[str] = None, until: Optional[str] = None):
+    """Get all messages for a project, optionally limited to an ISO timestamp window"""
     try:
-        messages = db.get_messages_for_project(project_id, limit)
+        # SQLite reads (and the buffered-write flush they wait on) run off the event loop
+        messages = await asyncio.to_thread(db.get_messages_for_project, project_id, limit, since, until)
         return {"messages": messages, "count": len(messages)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/database/messages/{project_id}/{equipment_id}")
-async def get_equipment_messages(project_id: str, equipment_id: str, limit: Optional[int] = None):
-    """Get messages for specific equipment"""
+async def get_equipment_messages(project_id: str, equipment_id: str, limit: Optional[int] = None,
+                                 since: Optional[str] = None, until: Optional[str] = None):
+    """Get messages for specific equipment, optionally limited to an ISO timestamp window"""
     try:
-        messages = db.get_messages_for_equipment(project_id, equipment_id, limit)
+        messages = await asyncio.to_thread(db.get_messages_for_equipment, project_id, equipment_id, limit, since, until)
         return {"messages": messages, "count": len(messages)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -758,7 +1034,7 @@ async def get_project_sessions(project_id: str):
 async def export_project_data(project_id: str):
     """Export all data for a project"""
     try:
-        data = db.export_project_data(project_id)
+        data = await asyncio.to_thread(db.export_project_data, project_id)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -789,7 +1065,7 @@ async def delete_project_data(project_id: str):
 async def get_storage_stats():
     """Get storage statistics"""
     try:
-        stats = db.get_storage_stats()
+        stats = await asyncio.to_thread(db.get_storage_stats)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -806,6 +1082,7 @@ async def chatbot_query(request: dict):
         cell_id = request.get('cell_id', None)
         references = request.get('references', [])  # Get @ references from frontend
         project_id = request.get('project_id', None)  # Get project_id from frontend
+        nocache = bool(request.get('nocache', False))  # Skip cached responses for repeat queries
         
         if not user_query:
             raise HTTPException(status_code=400, detail="Query is required")
@@ -816,7 +1093,8 @@ async def chatbot_query(request: dict):
             page_type=page_type,
             cell_id=cell_id,
             references=references,
-            project_id=project_id
+            project_id=project_id,
+            nocache=nocache
         )
         
         return {
@@ -830,23 +1108,59 @@ async def chatbot_query(request: dict):
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Chatbot query failed: {error_msg}")
-        
-        # Check if it's a quota/API error
-        if "429" in error_msg or "quota" in error_msg.lower() or "RESOURCE_EXHAUSTED" in error_msg:
-            user_message = (
-                "I apologize, but the AI service is currently experiencing quota limitations. "
-                "Please try again in a few minutes. "
-                "If this persists, you may need to upgrade your API plan or wait for quota reset."
-            )
-        elif "API" in error_msg or "api_key" in error_msg.lower():
-            user_message = (
-                "I apologize, but there's an issue with the AI service configuration. "
-                "Please check that your API key (GROQ_API_KEY or GEMINI_API_KEY) is valid and has available quota."
-            )
-        else:
-            user_message = f"I apologize, but I encountered an error processing your query: {error_msg[:200]}"
-        
-        raise HTTPException(status_code=500, detail=user_message)
+        raise HTTPException(status_code=500, detail=_chatbot_error_message(error_msg))
+
+@app.post("/api/chatbot/query/stream")
+async def chatbot_query_stream(request: dict):
+    """Process chatbot query with CrewAI, streaming progress and the answer as NDJSON"""
+    from crewai_service import crewai_service
+    
+    user_query = request.get('query', '')
+    page_type = request.get('page_type', 'monitor')  # 'monitor' or 'equipment'
+    cell_id = request.get('cell_id', None)
+    references = request.get('references', [])  # Get @ references from frontend
+    project_id = request.get('project_id', None)  # Get project_id from frontend
+    
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    
+    async def event_stream():
+        try:
+            async for event in crewai_service.process_query_stream(
+                user_query=user_query,
+                page_type=page_type,
+                cell_id=cell_id,
+                references=references,
+                project_id=project_id
+            ):
+                yield json.dumps(event) + "\n"
+            yield json.dumps({'type': 'done', 'timestamp': datetime.now().isoformat()}) + "\n"
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"Chatbot stream query failed: {error_msg}")
+            yield json.dumps({'type': 'error', 'detail': _chatbot_error_message(error_msg)}) + "\n"
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+# Error-text classifiers for _chatbot_error_message (only the lowercase markers are case-insensitive)
+_QUOTA_ERROR_RE = re.compile(r'429|(?i:quota)|RESOURCE_EXHAUSTED')
+_API_ERROR_RE = re.compile(r'API|(?i:api_key)')
+
+def _chatbot_error_message(error_msg: str) -> str:
+    """Map a chatbot failure to a user-facing message"""
+    # Check if it's a quota/API error
+    if _QUOTA_ERROR_RE.search(error_msg):
+        return (
+            "I apologize, but the AI service is currently experiencing quota limitations. "
+            "Please try again in a few minutes. "
+            "If this persists, you may need to upgrade your API plan or wait for quota reset."
+        )
+    elif _API_ERROR_RE.search(error_msg):
+        return (
+            "I apologize, but there's an issue with the AI service configuration. "
+            "Please check that your API key (GROQ_API_KEY or GEMINI_API_KEY) is valid and has available quota."
+        )
+    return f"I apologize, but I encountered an error processing your query: {error_msg[:200]}"
 
 @app.get("/api/chatbot/cells")
 async def get_available_cells():
@@ -1385,7 +1699,7 @@ async def upload_document(project_id: str, file: UploadFile = File(...),
 
         try:
             # Add document to vector store (async processing with content)
-            doc_id = await vector_store.add_document_async(
+            doc_id = await get_vector_store().add_document_async(
                 project_id=project_id,
                 file_content=contents,
                 filename=file.filename,
@@ -1485,7 +1799,7 @@ async def delete_document(project_id: str, doc_id: str):
             raise HTTPException(status_code=404, detail="Document not found")
 
         # Delete from vector store (now requires project_id for per-project collections)
-        deleted = vector_store.delete_document(project_id, doc_id)
+        deleted = get_vector_store().delete_document(project_id, doc_id)
         if not deleted:
             logger.warning(f"Document {doc_id} not found in vector store during deletion")
 
@@ -1512,7 +1826,7 @@ async def get_document_stats(project_id: str):
     """Get document statistics for a project"""
     try:
         # Get vector store stats
-        vector_stats = vector_store.get_document_stats(project_id)
+        vector_stats = get_vector_store().get_document_stats(project_id)
 
         # Get project document metadata
         project = db.load_project(project_id)
@@ -1634,7 +1948,7 @@ async def list_projects():
         projects = []
         for project_file in db.projects_dir.glob("*.json"):
             project_id = project_file.stem  # Remove .json extension
-            project = db.load_project(project_id)
+            project = db.load_project_readonly(project_id)
             if project:
                 # Return full project data
                 projects.append(project)
@@ -1658,7 +1972,7 @@ async def list_project_summaries():
         projects = []
         for project_file in db.projects_dir.glob("*.json"):
             project_id = project_file.stem  # Remove .json extension
-            project = db.load_project(project_id)
+            project = db.load_project_readonly(project_id)
             if project:
                 # Return summary info
                 projects.append({
@@ -1708,9 +2022,11 @@ async def health_check():
 
 @app.on_event("startup")
 async def startup_event():
-    """Store the main event loop for thread-safe async operations"""
-    global main_loop
+    """Store the main event loop for thread-safe async operations and start the broadcaster"""
+    global main_loop, broadcast_ready, broadcaster_task
     main_loop = asyncio.get_event_loop()
+    broadcast_ready = asyncio.Event()
+    broadcaster_task = asyncio.create_task(broadcaster())
     logger.info("FastAPI application started")
 
 @app.on_event("shutdown")
@@ -1721,10 +2037,21 @@ async def shutdown_event():
         current_discovery.stop()
     if current_monitoring:
         current_monitoring.stop()
+    if broadcaster_task:
+        broadcaster_task.cancel()
     logger.info("FastAPI application shutdown")
 
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting MQTT GUI Backend Server (FastAPI) on http://localhost:8001")
     print("📡 WebSocket will be available at ws://localhost:8001/ws")
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
+    # uvicorn picks uvloop and httptools automatically when they are installed.
+    # MQTT sessions, the graph manager and WebSocket clients live in process memory,
+    # so each worker has its own; keep WEB_CONCURRENCY at 1 unless clients are
+    # pinned to a worker (e.g. one project per worker behind a sticky proxy).
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        print(f"⚠️ Running {workers} workers; monitoring state is not shared between them")
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001, workers=1) 
\ No newline at end of file
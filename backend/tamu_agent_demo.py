@@ -5,6 +5,7 @@ A simple example showing CrewAI agent with TAMUS AI inference and 2 tools
 """
 
 import os
+import time
 from typing import Any, Dict
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import tool
@@ -69,6 +70,13 @@ def text_analyzer_tool(text: str) -> Dict[str, Any]:
 
 from crewai.llm import LLM
 
+# Transient failures (timeouts, dropped connections, 5xx) are retried per call with
+# exponential backoff rather than failing, and re-running, the whole crew. 429s are
+# left to ChatbotCrew, whose backoff is shared across queries
+TRANSIENT_MAX_ATTEMPTS = 3
+TRANSIENT_BASE_DELAY = 0.5  # seconds
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
 class TAMUSAILLM(LLM):
     """Custom TAMUS AI LLM class that properly inherits from CrewAI's LLM"""
 
@@ -81,6 +89,13 @@ class TAMUSAILLM(LLM):
         if not self.custom_api_key:
             raise ValueError("TAMUS_AI_CHAT_API_KEY environment variable is required")
 
+        # Request constants, built once rather than on every call
+        self._headers = {
+            "Authorization": f"Bearer {self.custom_api_key}",
+            "Content-Type": "application/json"
+        }
+        self._completions_url = f"{self.custom_base_url}/api/chat/completions"
+
         # Initialize parent class with minimal required parameters
         # We'll override the call method to bypass LiteLLM
         super().__init__(
@@ -98,11 +113,6 @@ class TAMUSAILLM(LLM):
         """Override the parent call method to use TAMUS AI directly"""
         import requests
 
-        headers = {
-            "Authorization": f"Bearer {self.custom_api_key}",
-            "Content-Type": "application/json"
-        }
-
         # Ensure messages is in the right format
         if isinstance(messages, str):
             formatted_messages = [{"role": "user", "content": messages}]
@@ -119,12 +129,26 @@ class TAMUSAILLM(LLM):
         }
 
         try:
-            response = requests.post(
-                f"{self.custom_base_url}/api/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            for attempt in range(TRANSIENT_MAX_ATTEMPTS):
+                try:
+                    response = requests.post(
+                        self._completions_url,
+                        headers=self._headers,
+                        json=payload,
+                        timeout=30
+                    )
+                except (requests.Timeout, requests.ConnectionError) as e:
+                    if attempt == TRANSIENT_MAX_ATTEMPTS - 1:
+                        raise
+                    failure = e
+                else:
+                    if response.status_code not in TRANSIENT_STATUS_CODES or attempt == TRANSIENT_MAX_ATTEMPTS - 1:
+                        break
+                    failure = f"HTTP {response.status_code}"
+
+                delay = TRANSIENT_BASE_DELAY * 2 ** attempt
+                print(f"⚠️ TAMUS AI transient error ({failure}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
 
             if response.status_code == 200:
                 result = response.json()
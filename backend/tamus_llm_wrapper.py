@@ -42,6 +42,12 @@ class TAMUSAILLM(LLM):
         if not self.api_key:
             raise ValueError("TAMUS_AI_CHAT_API_KEY environment variable is required")
 
+        # Request headers, built once rather than on every direct call
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
         logger.info(f"Initializing TAMUS AI LLM with model: {self.model}")
         logger.info(f"Using base URL: {self.base_url}")
 
@@ -89,10 +95,6 @@ class TAMUSAILLM(LLM):
 
         try:
             url = f"{self.base_url}/api/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
 
             data = {
                 "model": self.model,
@@ -102,7 +104,7 @@ class TAMUSAILLM(LLM):
             }
 
             logger.info(f"Making direct HTTP request to TAMUS AI: {url}")
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+            response = requests.post(url, headers=self._headers, json=data, timeout=30)
 
             if response.status_code == 200:
                 result = response.json()
@@ -138,10 +140,7 @@ class TAMUSAILLM(LLM):
         try:
             response = requests.get(
                 f"{self.base_url}/api/models",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
+                headers=self._headers,
                 timeout=10
             )
 
@@ -8,6 +8,12 @@ import requests
 import logging
 from typing import Dict, List, Optional, Any
 
+# orjson parses the raw response bytes directly; fall back when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,6 +68,11 @@ class TDengineService:
                 timeout=(5, 30)  # (connect_timeout, read_timeout)
             )
             response.raise_for_status()
+            if orjson is not None:
+                try:
+                    return orjson.loads(response.content)
+                except orjson.JSONDecodeError:
+                    pass  # e.g. NaN/Infinity readings, which only the stdlib parser accepts
             return response.json()
         except requests.exceptions.Timeout:
             logger.error(f"TDengine query timed out - server not responding")
@@ -108,5 +119,33 @@ class TDengineService:
             logger.error(f"Failed to get sensors for {cell_id}: {e}")
             return []
 
+    def get_cell_sensors_batch(self, cell_ids: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Get available sensors for several cells in one UNION ALL query; None if the query failed"""
+        if not cell_ids:
+            return {}
+        try:
+            sql = " UNION ALL ".join(
+                f"SELECT DISTINCT '{cell_id}' AS cell_id, subtopic, field_name, unit, sensor_type FROM {cell_id}"
+                for cell_id in cell_ids
+            )
+            result = self.execute_query(sql)
+            if result.get("code") != 0:
+                return None
+            
+            sensors = {cell_id: [] for cell_id in cell_ids}
+            for row in result.get("data", []):
+                cell_sensors = sensors.get(row[0])
+                if cell_sensors is not None:
+                    cell_sensors.append({
+                        "subtopic": row[1],
+                        "field_name": row[2],
+                        "unit": row[3],
+                        "sensor_type": row[4]
+                    })
+            return sensors
+        except Exception as e:
+            logger.error(f"Failed to get sensors for {cell_ids}: {e}")
+            return None
+
 # Global instance
 tdengine_service = TDengineService()
@@ -12,9 +12,104 @@ from crewai.tools import tool
 from tdengine_service import tdengine_service
 import json
 import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+# Fast JSON rendering for large query results; stdlib json is used if missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent REST queries while fetching schema information
+SCHEMA_FETCH_WORKERS = 8
+
+# Rows of a query result passed back to the agent; 0 disables the cap
+MAX_RESULT_ROWS = int(os.getenv("TDENGINE_TOOL_MAX_ROWS", "200"))
+
+# Per-cell table info reused across chatbot queries: {cell_id: (expires_at, table_info)}
+SCHEMA_CACHE_TTL = float(os.getenv("TDENGINE_SCHEMA_CACHE_TTL", "300"))  # seconds, 0 disables
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
+# Cell number in loosely formatted IDs ("cell4", "Cell 4")
+_CELL_NUMBER_RE = re.compile(r'\d+')
+
+def _dumps_indented(data: Any) -> str:
+    """json.dumps(data, indent=2) for query results, rendered by orjson when available"""
+    # With indent set, stdlib json falls back to its pure-Python encoder
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except orjson.JSONEncodeError:
+            pass  # e.g. non-string keys or types orjson does not serialize
+    return json.dumps(data, indent=2)
+
+# One line per sensor in the schema context; format_map takes the sensor dict as-is
+_SENSOR_LINE = "- **{subtopic}** ({field_name}) - Unit: {unit}, Type: {sensor_type}\n".format_map
+
+# Static tail of the schema context (the @ reference mapping is fixed at startup),
+# rendered once instead of on every get_tdengine_schema call
+_SCHEMA_CONTEXT_FOOTER = "## Sensor Name Mapping (@ references):\n" + "".join(
+    f"- \"{key}\" → \"{value}\"\n" for key, value in tdengine_service.feature_mapping.items()
+) + """
+## SQL Query Principles:
+
+### Database Structure:
+- Primary timestamp column: `ts` (TIMESTAMP)
+- Sensor identifier column: `subtopic` (VARCHAR)
+- Value column: `reading` (DOUBLE)
+- Table naming: cell_N format (e.g., cell_1, cell_2)
+
+### Time Syntax:
+- Relative periods: NOW() - 24h, NOW() - 7d, NOW() - 1w, NOW() - 30d (NOT INTERVAL syntax)
+- Absolute dates: 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DDTHH:MM:SS.000Z'
+- Always include time filtering in WHERE clause
+
+### Query Optimization Principles (CRITICAL - Apply to ALL time periods):
+
+1. **ALL Time Periods (including 24 hours):**
+   - ALWAYS use SQL aggregation functions (AVG, STDDEV, MIN, MAX, PERCENTILE, COUNT) to calculate statistics directly
+   - NEVER fetch raw data points - they can cause context overflow even for short periods with many data points
+   - For trends: ALWAYS use INTERVAL grouping for time-based sampling (e.g., INTERVAL(10m) for 24h trends, INTERVAL(1h) for weekly trends, INTERVAL(1d) for monthly trends)
+   - For statistical queries: Calculate statistics in SQL, return aggregated values only
+   - For comparison queries: Use statistical aggregation per cell for comparison
+   - For correlation queries: Use time-bucketing, return only correlation coefficient and statistics
+
+3. **Multi-Cell Queries:**
+   - For all-cell searches: FIRST execute "SHOW TABLES" to discover ALL available cell tables (don't assume cell_1 through cell_5)
+   - Use UNION ALL to query ALL discovered cells in single query
+   - Include cell_id in SELECT to identify source cell
+   - Apply same filtering conditions uniformly across all cells
+   - For "right now" or "current" queries: Use ORDER BY ts DESC LIMIT 1 per cell, and consider adding time filter (ts >= NOW() - 1h) to ensure readings are recent
+
+4. **Correlation Queries (CRITICAL - ALL time periods):**
+   - Sensors may have different timestamps - use time-bucketing with INTERVAL to align them
+   - Use INTERVAL grouping to create time windows, then calculate correlation from aligned data
+   - Filter out NULL values after bucketing
+   - ALWAYS return ONLY correlation coefficient, covariance, and data_point_count - NEVER return raw or bucketed data points
+   - This prevents context overflow even for short periods (24 hours) that may have thousands of data points
+
+5. **Statistical Functions:**
+   - Available: AVG, STDDEV, VAR, MIN, MAX, COUNT, SUM, PERCENTILE, FIRST, LAST
+   - Correlation: Manual formula (AVG(x*y) - AVG(x)*AVG(y)) / (STDDEV(x) * STDDEV(y))
+
+### Query Patterns:
+
+- **Current Value:** ORDER BY ts DESC LIMIT 1
+- **Historical Data:** Include time filtering, ORDER BY ts ASC
+- **Aggregation:** Use AVG, STDDEV, MIN, MAX, PERCENTILE, COUNT for statistics
+- **Time Sampling:** Use INTERVAL grouping for trend analysis over long periods
+- **Multi-Cell:** Use UNION ALL with cell_id in SELECT
+- **Filtering:** Apply WHERE conditions for sensor names, value thresholds, time ranges
+
+"""
+
 @tool("Execute TDengine SQL Query")
 def execute_tdengine_query(sql_query: str) -> str:
     """
@@ -42,21 +137,29 @@ def execute_tdengine_query(sql_query: str) -> str:
             data = result.get("data", [])
             columns = result.get("columns", [])
             
+            # Raw dumps are capped so one broad query cannot flood the agent's context
+            truncated = 0 < MAX_RESULT_ROWS < len(data)
+            rows = data[:MAX_RESULT_ROWS] if truncated else data
+            
             # Format response with column names if available
-            formatted_data = []
-            for row in data:
-                if columns:
-                    row_dict = {columns[i]: row[i] for i in range(min(len(columns), len(row)))}
-                    formatted_data.append(row_dict)
-                else:
-                    formatted_data.append(row)
+            if columns:
+                formatted_data = [dict(zip(columns, row)) for row in rows]
+            else:
+                formatted_data = list(rows)
             
-            return json.dumps({
+            response = {
                 "status": "success",
                 "data": formatted_data,
                 "row_count": len(data),
                 "columns": columns if columns else []
-            }, indent=2)
+            }
+            if truncated:
+                response["truncated"] = True
+                response["note"] = (
+                    f"Only the first {MAX_RESULT_ROWS} of {len(data)} rows are shown. "
+                    "Use SQL aggregation (AVG, MIN, MAX, COUNT, INTERVAL) instead of fetching raw rows."
+                )
+            return _dumps_indented(response)
         else:
             error_msg = result.get("desc", "Unknown error")
             error_code = result.get("code", -1)
@@ -97,21 +200,31 @@ def get_tdengine_schema(cell_ids: str) -> str:
         get_tdengine_schema("cell 1, cell4")  # Will be normalized to cell_1,cell_4
     """
     try:
-        import re
-        
-        # Normalize cell IDs
-        cell_list = [c.strip() for c in cell_ids.split(',')]
+        # One pass over the requested IDs: normalize each, then either take its table
+        # info from the cache (table layouts rarely change) or queue it for fetching
         normalized_cells = []
-        
-        for cell_id in cell_list:
-            # Handle formats: "cell 1" -> "cell_1", "cell4" -> "cell_4", "cell_1" -> "cell_1"
-            if ' ' in cell_id:
-                cell_id = cell_id.replace(' ', '_')
-            if not cell_id.startswith('cell_'):
-                match = re.search(r'\d+', cell_id)
-                if match:
-                    cell_id = f"cell_{match.group()}"
-            normalized_cells.append(cell_id)
+        table_infos = {}
+        cells_to_fetch = {}  # ordered set
+        now = time.monotonic()
+        with _schema_cache_lock:
+            for cell_id in cell_ids.split(','):
+                # Handle formats: "cell 1" -> "cell_1", "cell4" -> "cell_4", "cell_1" -> "cell_1"
+                cell_id = cell_id.strip()
+                if ' ' in cell_id:
+                    cell_id = cell_id.replace(' ', '_')
+                if not cell_id.startswith('cell_'):
+                    match = _CELL_NUMBER_RE.search(cell_id)
+                    if match:
+                        cell_id = f"cell_{match.group()}"
+                normalized_cells.append(cell_id)
+                
+                if cell_id in table_infos or cell_id in cells_to_fetch:
+                    continue
+                entry = _schema_cache.get(cell_id)
+                if entry is not None and entry[0] > now:
+                    table_infos[cell_id] = entry[1]
+                else:
+                    cells_to_fetch[cell_id] = None
         
         logger.info(f"Fetching schema for cells: {normalized_cells}")
         
@@ -121,20 +234,55 @@ def get_tdengine_schema(cell_ids: str) -> str:
             "sensor_mappings": tdengine_service.feature_mapping
         }
         
-        for cell_id in normalized_cells:
-            # Get CREATE TABLE statement
-            create_result = tdengine_service.execute_query(f"SHOW CREATE TABLE {cell_id}")
+        # Each query is an independent REST round-trip, so issue them all at once
+        # instead of sequential requests per cell; sensor lists for every cell
+        # come from a single UNION ALL query
+        with ThreadPoolExecutor(max_workers=max(1, min(SCHEMA_FETCH_WORKERS, 2 * len(cells_to_fetch) + 1))) as executor:
+            sensors_future = executor.submit(tdengine_service.get_cell_sensors_batch, list(cells_to_fetch))
+            pending = [
+                (
+                    cell_id,
+                    # CREATE TABLE statement
+                    executor.submit(tdengine_service.execute_query, f"SHOW CREATE TABLE {cell_id}"),
+                    # Column details
+                    executor.submit(tdengine_service.execute_query, f"DESCRIBE {cell_id}"),
+                )
+                for cell_id in cells_to_fetch
+            ]
+            
+            batch_sensors = sensors_future.result()
+            if batch_sensors is None:
+                # The batch fails as a whole (e.g. one table is missing); query cells one by one
+                sensor_futures = {
+                    cell_id: executor.submit(
+                        tdengine_service.execute_query,
+                        f"SELECT DISTINCT subtopic, field_name, unit, sensor_type FROM {cell_id}"
+                    )
+                    for cell_id in cells_to_fetch
+                }
+        
+        for cell_id, create_future, describe_future in pending:
+            create_result = create_future.result()
             create_data = create_result.get("data", []) if create_result.get("code") == 0 else []
             
-            # Get column details
-            describe_result = tdengine_service.execute_query(f"DESCRIBE {cell_id}")
+            describe_result = describe_future.result()
             describe_data = describe_result.get("data", []) if describe_result.get("code") == 0 else []
             
-            # Get sensors
-            sensors_result = tdengine_service.execute_query(
-                f"SELECT DISTINCT subtopic, field_name, unit, sensor_type FROM {cell_id}"
-            )
-            sensors_data = sensors_result.get("data", []) if sensors_result.get("code") == 0 else []
+            if batch_sensors is not None:
+                sensors = batch_sensors[cell_id]
+                sensors_ok = True
+            else:
+                sensors_result = sensor_futures[cell_id].result()
+                sensors_ok = sensors_result.get("code") == 0
+                sensors = [
+                    {
+                        "subtopic": row[0],
+                        "field_name": row[1],
+                        "unit": row[2],
+                        "sensor_type": row[3]
+                    }
+                    for row in (sensors_result.get("data", []) if sensors_ok else [])
+                ]
             
             table_info = {
                 "table_name": cell_id,
@@ -148,31 +296,32 @@ def get_tdengine_schema(cell_ids: str) -> str:
                     }
                     for row in describe_data
                 ],
-                "sensors": [
-                    {
-                        "subtopic": row[0],
-                        "field_name": row[1],
-                        "unit": row[2],
-                        "sensor_type": row[3]
-                    }
-                    for row in sensors_data
-                ]
+                "sensors": sensors
             }
+            table_infos[cell_id] = table_info
             
-            schema_info["tables"].append(table_info)
+            # Only complete answers are reused, so a failed query is retried next time
+            if SCHEMA_CACHE_TTL > 0 and sensors_ok and all(
+                result.get("code") == 0 for result in (create_result, describe_result)
+            ):
+                with _schema_cache_lock:
+                    _schema_cache[cell_id] = (time.monotonic() + SCHEMA_CACHE_TTL, table_info)
+        
+        schema_info["tables"] = [table_infos[cell_id] for cell_id in normalized_cells]
         
-        # Format as context string for LLM
-        context = f"""# TDengine Database Schema Information
+        # Format as context string for LLM; fragments are collected and joined once
+        # rather than grown with += per table/column/sensor
+        parts = [f"""# TDengine Database Schema Information
 
 ## Database: {schema_info['database']}
 
 ## Available Tables (Cells):
 {', '.join([t['table_name'] for t in schema_info['tables']])}
 
-"""
+"""]
         
         for table in schema_info["tables"]:
-            context += f"""## Table: {table['table_name']}
+            parts.append(f"""## Table: {table['table_name']}
 
 ### Table Structure:
 ```sql
@@ -180,79 +329,23 @@ def get_tdengine_schema(cell_ids: str) -> str:
 ```
 
 ### Columns:
-"""
+""")
             for col in table['columns']:
                 col_info = f"- **{col['name']}**: {col['type']}"
                 if col['length']:
                     col_info += f"({col['length']})"
                 if col['note']:
                     col_info += f" - {col['note']}"
-                context += col_info + "\n"
+                parts.append(col_info + "\n")
             
-            context += f"\n### Available Sensors ({len(table['sensors'])} total):\n"
-            for sensor in table['sensors']:
-                context += f"- **{sensor['subtopic']}** ({sensor['field_name']}) - Unit: {sensor['unit']}, Type: {sensor['sensor_type']}\n"
-            context += "\n"
-        
-        context += f"""## Sensor Name Mapping (@ references):
-"""
-        for key, value in schema_info['sensor_mappings'].items():
-            context += f"- \"{key}\" → \"{value}\"\n"
+            parts.append(f"\n### Available Sensors ({len(table['sensors'])} total):\n")
+            parts.extend(map(_SENSOR_LINE, table['sensors']))
+            parts.append("\n")
         
-        context += f"""
-## SQL Query Principles:
-
-### Database Structure:
-- Primary timestamp column: `ts` (TIMESTAMP)
-- Sensor identifier column: `subtopic` (VARCHAR)
-- Value column: `reading` (DOUBLE)
-- Table naming: cell_N format (e.g., cell_1, cell_2)
-
-### Time Syntax:
-- Relative periods: NOW() - 24h, NOW() - 7d, NOW() - 1w, NOW() - 30d (NOT INTERVAL syntax)
-- Absolute dates: 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DDTHH:MM:SS.000Z'
-- Always include time filtering in WHERE clause
-
-### Query Optimization Principles (CRITICAL - Apply to ALL time periods):
-
-1. **ALL Time Periods (including 24 hours):**
-   - ALWAYS use SQL aggregation functions (AVG, STDDEV, MIN, MAX, PERCENTILE, COUNT) to calculate statistics directly
-   - NEVER fetch raw data points - they can cause context overflow even for short periods with many data points
-   - For trends: ALWAYS use INTERVAL grouping for time-based sampling (e.g., INTERVAL(10m) for 24h trends, INTERVAL(1h) for weekly trends, INTERVAL(1d) for monthly trends)
-   - For statistical queries: Calculate statistics in SQL, return aggregated values only
-   - For comparison queries: Use statistical aggregation per cell for comparison
-   - For correlation queries: Use time-bucketing, return only correlation coefficient and statistics
-
-3. **Multi-Cell Queries:**
-   - For all-cell searches: FIRST execute "SHOW TABLES" to discover ALL available cell tables (don't assume cell_1 through cell_5)
-   - Use UNION ALL to query ALL discovered cells in single query
-   - Include cell_id in SELECT to identify source cell
-   - Apply same filtering conditions uniformly across all cells
-   - For "right now" or "current" queries: Use ORDER BY ts DESC LIMIT 1 per cell, and consider adding time filter (ts >= NOW() - 1h) to ensure readings are recent
-
-4. **Correlation Queries (CRITICAL - ALL time periods):**
-   - Sensors may have different timestamps - use time-bucketing with INTERVAL to align them
-   - Use INTERVAL grouping to create time windows, then calculate correlation from aligned data
-   - Filter out NULL values after bucketing
-   - ALWAYS return ONLY correlation coefficient, covariance, and data_point_count - NEVER return raw or bucketed data points
-   - This prevents context overflow even for short periods (24 hours) that may have thousands of data points
-
-5. **Statistical Functions:**
-   - Available: AVG, STDDEV, VAR, MIN, MAX, COUNT, SUM, PERCENTILE, FIRST, LAST
-   - Correlation: Manual formula (AVG(x*y) - AVG(x)*AVG(y)) / (STDDEV(x) * STDDEV(y))
-
-### Query Patterns:
-
-- **Current Value:** ORDER BY ts DESC LIMIT 1
-- **Historical Data:** Include time filtering, ORDER BY ts ASC
-- **Aggregation:** Use AVG, STDDEV, MIN, MAX, PERCENTILE, COUNT for statistics
-- **Time Sampling:** Use INTERVAL grouping for trend analysis over long periods
-- **Multi-Cell:** Use UNION ALL with cell_id in SELECT
-- **Filtering:** Apply WHERE conditions for sensor names, value thresholds, time ranges
-
-"""
+        # Mapping and query guidance never change between calls
+        parts.append(_SCHEMA_CONTEXT_FOOTER)
         
-        return context
+        return "".join(parts)
         
     except Exception as e:
         logger.error(f"Exception fetching TDengine schema: {e}")
@@ -20,7 +20,7 @@ from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from crewai.tools import tool
-from vectorstore_service import vector_store
+from vectorstore_service import get_vector_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,7 +42,7 @@ def _run_async_search(query: str, project_id: str, equipment_id: Optional[str],
     asyncio.set_event_loop(loop)
     try:
         result = loop.run_until_complete(
-            vector_store.search_similar(
+            get_vector_store().search_similar(
                 query=query,
                 project_id=project_id,
                 equipment_id=equipment_id,
@@ -113,12 +113,14 @@ def search_domain_knowledge(query: str) -> str:
         # Group results by document for better readability
         documents = {}
         for result in results:
-            doc_id = result['metadata']['doc_id']
-            filename = result.get('filename') or result['metadata'].get('filename')
-
-            if doc_id not in documents:
-                documents[doc_id] = {
-                    "filename": filename,
+            # Bound once; each result's metadata is consulted several times below
+            metadata = result['metadata']
+            doc_id = metadata['doc_id']
+
+            doc_data = documents.get(doc_id)
+            if doc_data is None:
+                doc_data = documents[doc_id] = {
+                    "filename": result.get('filename') or metadata.get('filename'),
                     "equipment_id": result.get('equipment_id'),
                     "sensor_type": result.get('sensor_type'),
                     "document_type": result.get('document_type'),
@@ -127,23 +129,24 @@ def search_domain_knowledge(query: str) -> str:
                 }
 
             # Include page number and element type in chunk info
+            content = result['content']
             chunk_info = {
-                "content": result['content'][:500] + "..." if len(result['content']) > 500 else result['content'],
+                "content": content[:500] + "..." if len(content) > 500 else content,
                 "similarity_score": round(result['similarity_score'], 4),
-                "chunk_index": result['metadata'].get('chunk_index')
+                "chunk_index": metadata.get('chunk_index')
             }
             
             # Add page number if available
-            page_number = result.get('page_number') or result['metadata'].get('page_number')
+            page_number = result.get('page_number') or metadata.get('page_number')
             if page_number is not None:
                 chunk_info["page_number"] = page_number
             
             # Add element type if available
-            element_type = result.get('element_type') or result['metadata'].get('element_type')
+            element_type = result.get('element_type') or metadata.get('element_type')
             if element_type:
                 chunk_info["element_type"] = element_type
 
-            documents[doc_id]["chunks"].append(chunk_info)
+            doc_data["chunks"].append(chunk_info)
 
         # Convert to list format and sort by affiliation priority
         affiliation_priority = {'sensor': 0, 'equipment': 1, 'general': 2}
@@ -580,6 +580,11 @@ class VectorStoreService:
         Results are deduplicated and ranked by affiliation priority + similarity
         """
         try:
+            # Nothing to search: skip the embedding round-trip to Ollama entirely
+            if self._get_project_collection(project_id).count() == 0:
+                logger.info(f"No documents in project {project_id}; skipping similarity search")
+                return []
+            
             # Generate embedding for query
             query_embedding = await asyncio.get_event_loop().run_in_executor(
                 self.executor, self._generate_embedding, query
@@ -805,5 +810,13 @@ class VectorStoreService:
             return []
 
 
-# Global vector store instance
-vector_store = VectorStoreService()
+# Global vector store instance, created on first use so importing this module
+# does not open the ChromaDB client
+_vector_store_instance = None
+
+def get_vector_store() -> VectorStoreService:
+    """Get or create global VectorStoreService instance"""
+    global _vector_store_instance
+    if _vector_store_instance is None:
+        _vector_store_instance = VectorStoreService()
+    return _vector_store_instance
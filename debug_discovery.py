@@ -96,18 +96,18 @@ def test_equipment_detection():
         
         # Use the schema learner to extract equipment info
         extracted = schema_learner.analyze_message(data, topic)
-        equipment_id = extracted.get('equipment_id', 'unknown')
+        equipment_id = extracted.equipment_id
         
         print(f"   Extracted equipment_id: {equipment_id}")
-        print(f"   Extracted sensor_type: {extracted.get('sensor_type', 'unknown')}")
-        print(f"   Extracted value: {extracted.get('value', 'unknown')}")
+        print(f"   Extracted sensor_type: {extracted.sensor_type}")
+        print(f"   Extracted value: {extracted.value}")
         
         if equipment_id != 'unknown':
             if equipment_id not in discovered_equipment:
                 discovered_equipment[equipment_id] = {
                     'id': equipment_id,
                     'equipment_id': equipment_id,
-                    'equipment_type': extracted.get('sensor_type', 'unknown'),
+                    'equipment_type': extracted.sensor_type,
                     'topics': [topic],
                     'sample_data': data,
                     'message_count': 1
@@ -38,4 +38,10 @@ export const getApiUrlWithParams = (endpoint: string, params: Record<string, str
     url = url.replace(`{${key}}`, params[key]);
   });
   return `${API_BASE_URL}${url}`;
-}; 
\ No newline at end of file
+}; 
+// Helper function to parse a WebSocket message; broadcasts arrive as binary
+// (ArrayBuffer with binaryType = 'arraybuffer') UTF-8 JSON frames, replies as text
+const wsTextDecoder = new TextDecoder();
+export const parseWebSocketMessage = (data: string | ArrayBuffer): any => {
+  return JSON.parse(typeof data === 'string' ? data : wsTextDecoder.decode(data));
+};
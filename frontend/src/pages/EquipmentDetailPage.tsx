@@ -11,7 +11,7 @@ import {
   Legend,
   ResponsiveContainer
 } from 'recharts';
-import { WEBSOCKET_URL } from '../config/api';
+import { WEBSOCKET_URL, parseWebSocketMessage } from '../config/api';
 import { DatabaseService } from '../services/DatabaseService';
 import ChatBot from '../components/ChatBot';
 
@@ -177,6 +177,7 @@ const EquipmentDetailPage: React.FC = () => {
       try {
         const wsUrl = WEBSOCKET_URL.replace('http', 'ws') + '/ws';
         websocket = new WebSocket(wsUrl);
+        websocket.binaryType = 'arraybuffer';
 
         websocket.onopen = () => {
           console.log('Equipment detail WebSocket connected');
@@ -195,7 +196,7 @@ const EquipmentDetailPage: React.FC = () => {
 
         websocket.onmessage = (event) => {
           try {
-            const message = JSON.parse(event.data);
+            const message = parseWebSocketMessage(event.data);
             
             if (message.type === 'graph_update' && message.data.nodes) {
               const equipmentNode = message.data.nodes.find((node: any) => 
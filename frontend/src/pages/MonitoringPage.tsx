@@ -15,7 +15,7 @@ import AlertsPanel from '../components/AlertsPanel';
 import { ArrowLeft, Pause, Play, Settings, Activity, MessageCircle } from 'lucide-react';
 import { useProject } from '../contexts/ProjectContext';
 import { Project } from '../types';
-import { WEBSOCKET_URL, getApiUrl, API_ENDPOINTS } from '../config/api';
+import { WEBSOCKET_URL, getApiUrl, API_ENDPOINTS, parseWebSocketMessage } from '../config/api';
 
 import 'reactflow/dist/style.css';
 
@@ -125,6 +125,7 @@ const MonitoringPage: React.FC = () => {
       try {
         const wsUrl = WEBSOCKET_URL.replace('http', 'ws') + '/ws';
         const ws = new WebSocket(wsUrl);
+        ws.binaryType = 'arraybuffer';
 
         ws.onopen = () => {
           console.log('✅ WebSocket connected');
@@ -164,7 +165,7 @@ const MonitoringPage: React.FC = () => {
 
         ws.onmessage = (event) => {
           try {
-            const message = JSON.parse(event.data);
+            const message = parseWebSocketMessage(event.data);
 
             if (message.type === 'graph_update') {
               console.log('📊 Received graph update:', message.data);